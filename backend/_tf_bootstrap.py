@@ -0,0 +1,23 @@
+"""
+TensorFlow process setup. Import this before anything that imports TensorFlow.
+
+Environment variables are only read when TensorFlow initializes, so setting
+them here (once, for the whole process) keeps app.py, model_utils.py and the
+scripts from each configuring TF in a different order. Values already set in
+the environment take precedence.
+"""
+
+import os
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')  # Suppress TF warnings
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')  # oneDNN fused CPU kernels
+os.environ.setdefault('TF_FORCE_GPU_ALLOW_GROWTH', 'true')  # Memory growth
+os.environ.setdefault('TF_CUDNN_USE_AUTOTUNE', '1')  # Pick conv algorithms once
+os.environ.setdefault('TF_GPU_THREAD_MODE', 'gpu_private')  # Dedicated launch threads
+
+import tensorflow as tf
+
+# Configure TensorFlow for minimal memory usage
+tf.config.set_soft_device_placement(True)
+for gpu in tf.config.list_physical_devices('GPU'):
+    tf.config.experimental.set_memory_growth(gpu, True)
@@ -2,41 +2,65 @@
 FastAPI backend for tri-modal medicinal leaf classification with XAI.
 """
 
-import base64
+import _tf_bootstrap  # noqa: F401  (must run before TensorFlow is imported)
+
+import asyncio
+import hashlib
 import io
-import os
+import multiprocessing
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict
-
-# TensorFlow memory optimization - MUST be before any TF imports
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TF warnings
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # Disable oneDNN
-os.environ['TF_FORCE_GPU_ALLOW_GROWTH'] = 'true'  # Memory growth
+from typing import Dict, Optional, Tuple
 
-import tensorflow as tf
-# Configure TensorFlow for minimal memory usage
-tf.config.set_soft_device_placement(True)
-gpus = tf.config.list_physical_devices('GPU')
-if gpus:
-    for gpu in gpus:
-        tf.config.experimental.set_memory_growth(gpu, True)
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import cv2
 import numpy as np
-from fastapi import FastAPI, File, HTTPException, UploadFile
+import pybase64
+from PIL import Image, UnidentifiedImageError
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import ORJSONResponse, Response
 
+from batching import BatchScheduler
+from cache_utils import LRUCache
+from config import (
+    HOST,
+    PORT,
+    GRADCAM_CACHE_SIZE,
+    GRADCAM_JPEG_QUALITY,
+    GRADCAM_MAX_SIDE,
+    GRADCAM_MAX_SIDE_LIMIT,
+    INFERENCE_BATCH_TIMEOUT,
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_MODEL_PATH,
+    INFERENCE_QUEUE_SIZE,
+    MAX_FILE_SIZE,
+    MAX_IMAGE_PIXELS,
+    ONNX_MODEL_PATH,
+    PRELOAD_MODEL,
+    PREPROCESS_WORKERS,
+    RENDER_WORKERS,
+    RESPONSE_CACHE_SIZE,
+    WEB_CONCURRENCY,
+)
 from knowledge_utils import KnowledgeDB
 from model_utils import TriModalClassifier
-from preprocessing import preprocess_all_modalities
-from xai import generate_gradcam_overlay
+from preprocessing import init_worker, preprocess_all_modalities
+from xai import overlay_heatmap
 
 # Initialize FastAPI app
 app = FastAPI(
     title="TriModal Medicinal Leaf Classifier",
     description="AI-powered medicinal leaf identification with explainable AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # Faster JSON for the large payload
 )
 
 # Add CORS middleware for frontend integration
@@ -52,24 +76,87 @@ app.add_middleware(
 BASE_DIR = Path(__file__).parent
 MODEL_PATH = BASE_DIR / "best_model.keras"
 KNOWLEDGE_DB_PATH = BASE_DIR / "knowledge_db.json"
+MODEL_LOCK_PATH = Path(tempfile.gettempdir()) / "trimodal_model.lock"
 
 # Load model and knowledge DB lazily (on first request)
 classifier = None
+class_knowledge = None
 knowledge_db = None
 
+# Recently generated Grad-CAM overlays (JPEG bytes), served by /gradcam/{uid}
+gradcam_cache = LRUCache(GRADCAM_CACHE_SIZE)
+
+# Recent /predict results keyed by (upload SHA-256, query params), so repeated
+# uploads skip preprocessing, inference and Grad-CAM entirely
+response_cache = LRUCache(RESPONSE_CACHE_SIZE)
+
+# Bytes read per iteration when receiving an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def model_load_lock():
+    """
+    Serialize model loading across uvicorn worker processes.
+    
+    Loading several replicas at once multiplies peak memory, so workers take
+    turns. A no-op where fcntl isn't available.
+    """
+    if fcntl is None:
+        yield
+        return
+    
+    with open(MODEL_LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 
 def get_classifier():
-    """Lazy load the classifier on first use."""
+    """Load the classifier on first use (at startup when PRELOAD_MODEL is set)."""
     global classifier
     if classifier is None:
-        print("🔄 Loading model on first request...")
-        classifier = TriModalClassifier(str(MODEL_PATH))
+        print("🔄 Loading model...")
+        # Prefer ONNX Runtime, then TFLite, for forward-only predictions
+        inference_model_path = next(
+            (
+                str(path) for path in (ONNX_MODEL_PATH, INFERENCE_MODEL_PATH)
+                if path.exists()
+            ),
+            None
+        )
+        with model_load_lock():
+            classifier = TriModalClassifier(
+                str(MODEL_PATH),
+                inference_model_path,
+                # The micro-batcher sends any size up to its maximum
+                warmup_batch_sizes=range(1, INFERENCE_MAX_BATCH_SIZE + 1)
+            )
         print("✅ Model loaded successfully!")
     return classifier
 
 
+def get_class_knowledge():
+    """
+    Pair each class index with its name and formatted knowledge entry.
+    
+    Built once, so /predict resolves the top prediction with a list index
+    instead of a knowledge DB lookup per request.
+    """
+    global class_knowledge
+    if class_knowledge is None:
+        kb = get_knowledge_db()
+        class_knowledge = [
+            (name, kb.get_formatted_info(name))
+            for name in get_classifier().classes
+        ]
+    return class_knowledge
+
+
 def get_knowledge_db():
-    """Lazy load the knowledge database on first use."""
+    """Load the knowledge database on first use."""
     global knowledge_db
     if knowledge_db is None:
         print("🔄 Loading knowledge database...")
@@ -78,12 +165,35 @@ def get_knowledge_db():
     return knowledge_db
 
 
+# Batches concurrent /predict requests into a single prediction + Grad-CAM++
+# pass (predictions from the converted model when there is one, so they match
+# heatmap=false exactly)
+inference_scheduler = BatchScheduler(
+    lambda rgb, vein, texture: get_classifier().predict_with_gradcam(
+        rgb, vein, texture
+    ),
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait=INFERENCE_BATCH_TIMEOUT,
+    max_queue_size=INFERENCE_QUEUE_SIZE
+)
+
+# Forward-only batches for /predict?heatmap=false (served by ONNX Runtime or
+# TFLite when converted), so fast requests don't wait behind Grad-CAM batches
+prediction_scheduler = BatchScheduler(
+    lambda rgb, vein, texture: get_classifier().predict_batch(rgb, vein, texture),
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait=INFERENCE_BATCH_TIMEOUT,
+    max_queue_size=INFERENCE_QUEUE_SIZE
+)
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Check files exist but don't load heavy models yet."""
+    """Check files exist, start workers and (optionally) preload the models."""
     try:
         print("=" * 50)
-        print("🚀 Starting TriModal XAI Backend (Lazy Loading Mode)...")
+        mode = "Preload" if PRELOAD_MODEL else "Lazy Loading"
+        print(f"🚀 Starting TriModal XAI Backend ({mode} Mode)...")
         print("=" * 50)
         
         print(f"📂 Base directory: {BASE_DIR}")
@@ -99,8 +209,31 @@ async def startup_event():
         print(f"✅ Model file exists ({MODEL_PATH.stat().st_size / (1024*1024):.2f} MB)")
         print(f"✅ Knowledge DB exists ({KNOWLEDGE_DB_PATH.stat().st_size / 1024:.2f} KB)")
         
+        # Spawn (not fork) so workers don't inherit TensorFlow's threads
+        app.state.preprocess_pool = ProcessPoolExecutor(
+            max_workers=PREPROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker
+        )
+        print(f"⚙️ Preprocessing workers: {PREPROCESS_WORKERS}")
+        
+        # Bounded pool for Grad-CAM overlay + JPEG/base64 encoding
+        app.state.render_pool = ThreadPoolExecutor(
+            max_workers=RENDER_WORKERS, thread_name_prefix="render"
+        )
+        
+        inference_scheduler.start()
+        prediction_scheduler.start()
+        
+        if PRELOAD_MODEL:
+            # Load, trace and compile now so the first request is fast
+            get_class_knowledge()
+        
         print("\n" + "=" * 50)
-        print("🎉 Backend ready! Models will load on first request.")
+        if PRELOAD_MODEL:
+            print("🎉 Backend ready! Models loaded and warmed up.")
+        else:
+            print("🎉 Backend ready! Models will load on first request.")
         print("=" * 50)
         
     except Exception as e:
@@ -113,6 +246,15 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers."""
+    await inference_scheduler.stop()
+    await prediction_scheduler.stop()
+    app.state.preprocess_pool.shutdown(wait=False, cancel_futures=True)
+    app.state.render_pool.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -121,6 +263,7 @@ async def root():
         "message": "TriModal Medicinal Leaf Classifier API",
         "endpoints": {
             "predict": "/predict",
+            "gradcam": "/gradcam/{gradcam_id}",
             "health": "/health"
         }
     }
@@ -145,21 +288,126 @@ async def health_check():
     }
 
 
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """
+    Read an uploaded file in chunks, rejecting it as soon as it's too large.
+    
+    Args:
+        file: Uploaded file
+        max_bytes: Maximum accepted size in bytes
+    
+    Returns:
+        File contents
+    """
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large (max {max_bytes // (1024 * 1024)} MB)"
+            )
+    return bytes(buffer)
+
+
+def validate_image(image_bytes: bytes):
+    """
+    Check the image header is readable and the dimensions are acceptable.
+    
+    Only the header is parsed, so oversized images are rejected before any
+    pixels are decoded.
+    
+    Args:
+        image_bytes: Encoded image file contents
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            width, height = img.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(
+            status_code=400,
+            detail="File is not a readable image (JPG/PNG)"
+        )
+    
+    if width * height > MAX_IMAGE_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image too large ({width}x{height}, max {MAX_IMAGE_PIXELS} pixels)"
+        )
+
+
+def render_gradcam(
+    rgb_image: np.ndarray,
+    heatmap: np.ndarray,
+    max_side: int,
+    include_base64: bool
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Blend the Grad-CAM heatmap onto the image and encode it as JPEG.
+    
+    Args:
+        rgb_image: Clean RGB image (H, W, 3)
+        heatmap: uint8 Grad-CAM heatmap (h, w) scaled to [0, 255]
+        max_side: Longest side in pixels of the output image
+        include_base64: Also return the JPEG as a base64 string
+    
+    Returns:
+        Tuple of (JPEG bytes, base64 string or None)
+    """
+    # Downscale to the display size first so fewer pixels are blended
+    # and encoded; never upscale
+    h, w = rgb_image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        rgb_image = cv2.resize(
+            rgb_image,
+            (max(1, int(w * scale)), max(1, int(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+    gradcam_overlay = overlay_heatmap(rgb_image, heatmap)
+    
+    _, gradcam_jpeg = cv2.imencode(
+        ".jpg",
+        cv2.cvtColor(gradcam_overlay, cv2.COLOR_RGB2BGR),
+        [cv2.IMWRITE_JPEG_QUALITY, GRADCAM_JPEG_QUALITY]
+    )
+    gradcam_bytes = gradcam_jpeg.tobytes()
+    gradcam_base64 = (
+        pybase64.b64encode(gradcam_bytes).decode("ascii")
+        if include_base64 else None
+    )
+    
+    return gradcam_bytes, gradcam_base64
+
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)) -> Dict:
+async def predict(
+    file: UploadFile = File(...),
+    max_side: int = Query(GRADCAM_MAX_SIDE, ge=1),
+    include_base64: bool = Query(True),
+    heatmap: bool = Query(True)
+) -> Dict:
     """
     Predict medicinal leaf class from uploaded image.
     
     Args:
         file: Uploaded image file (JPG/PNG)
+        max_side: Longest side in pixels of the returned Grad-CAM image
+            (capped at GRADCAM_MAX_SIDE_LIMIT)
+        include_base64: Embed the Grad-CAM JPEG in the response; clients
+            that fetch gradcam_url instead can turn this off to skip the
+            base64 encoding and its ~33% size overhead
+        heatmap: Compute the Grad-CAM++ visualization; when false only the
+            forward pass runs and the gradcam_* fields are omitted. The
+            predictions are the same either way.
     
     Returns:
         JSON response with predictions, knowledge, and Grad-CAM visualization
     """
-    # Lazy load models on first request
+    # Load models if they weren't preloaded at startup
     try:
         model = get_classifier()
-        kb = get_knowledge_db()
+        class_entries = get_class_knowledge()
     except Exception as e:
         raise HTTPException(
             status_code=503,
@@ -173,66 +421,97 @@ async def predict(file: UploadFile = File(...)) -> Dict:
             detail="File must be an image (JPG/PNG)"
         )
     
+    # Read the upload with a size cap
+    image_bytes = await read_upload(file, MAX_FILE_SIZE)
+    max_side = min(max_side, GRADCAM_MAX_SIDE_LIMIT)
+    
+    # Serve repeated uploads from the cache
+    cache_key = (
+        hashlib.sha256(image_bytes).digest(), max_side, include_base64, heatmap
+    )
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        response, gradcam_bytes = cached
+        if gradcam_bytes is not None:
+            # Keep the cached gradcam_url valid even if /gradcam evicted it
+            gradcam_cache.put(response["gradcam_id"], gradcam_bytes)
+        print("Returning cached prediction")
+        return response
+    
+    # Check it's a usable image
+    validate_image(image_bytes)
+    
     try:
-        # Read uploaded file
-        image_bytes = await file.read()
-        
-        # Step 1: Preprocess all modalities
+        # Step 1: Preprocess all modalities in a worker process
         print("Preprocessing image modalities...")
-        rgb_clean, vein_enhanced, texture_enhanced = preprocess_all_modalities(
-            image_bytes
+        rgb_clean, vein_enhanced, texture_enhanced = (
+            await asyncio.get_running_loop().run_in_executor(
+                app.state.preprocess_pool, preprocess_all_modalities, image_bytes
+            )
         )
         
-        # Step 2: Run inference
+        # Step 2: Run inference, with Grad-CAM++ in the same pass if
+        # requested (batched with concurrent requests)
         print("Running model inference...")
-        predictions, preprocessed_inputs = model.predict(
+        preprocessed_inputs = model.preprocess_for_model(
             rgb_clean, vein_enhanced, texture_enhanced
         )
+        samples = [img[0] for img in preprocessed_inputs]
+        try:
+            if heatmap:
+                probs, gradcam_heatmap = await inference_scheduler.submit(*samples)
+            else:
+                probs = await prediction_scheduler.submit(*samples)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly"
+            )
+        predictions = probs[np.newaxis]
         
         # Step 3: Get top-3 predictions
         top3_predictions = model.get_top_predictions(predictions, top_k=3)
         
-        # Step 4: Get predicted class and confidence
-        predicted_class = top3_predictions[0]["class"]
+        # Step 4: Get predicted class, confidence and knowledge
+        predicted_class, knowledge_info = class_entries[top3_predictions[0]["index"]]
         confidence = top3_predictions[0]["confidence"]
         
         print(f"Predicted: {predicted_class} (confidence: {confidence:.4f})")
         
-        # Step 5: Retrieve knowledge for predicted class
-        print("Retrieving medicinal knowledge...")
-        knowledge_info = kb.get_formatted_info(predicted_class)
-        
-        # Step 6: Generate Grad-CAM++ visualization
-        print("Generating Grad-CAM++ heatmap...")
-        predicted_index = np.argmax(predictions[0])
-        
-        gradcam_overlay = generate_gradcam_overlay(
-            model=model.model,
-            rgb_image=rgb_clean,
-            img_inputs=preprocessed_inputs,
-            layer_name="fused_reduce",  # From your model architecture
-            class_index=predicted_index,
-            use_gradcam_plus_plus=True
-        )
-        
-        # Step 7: Convert Grad-CAM image to base64
-        gradcam_pil = Image.fromarray(gradcam_overlay)
-        buffered = io.BytesIO()
-        gradcam_pil.save(buffered, format="PNG")
-        gradcam_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
-        # Step 8: Build response
         response = {
             "predicted_class": predicted_class,
             "confidence": confidence,
             "top3": top3_predictions,
-            "knowledge": knowledge_info,
-            "gradcam_image_base64": gradcam_base64
+            "knowledge": knowledge_info
         }
+        gradcam_bytes = None
+        
+        if heatmap:
+            # Step 5: Overlay the Grad-CAM++ heatmap and encode it, off the
+            # event loop (cv2 releases the GIL, so renders run in parallel)
+            print("Generating Grad-CAM++ heatmap...")
+            gradcam_bytes, gradcam_base64 = (
+                await asyncio.get_running_loop().run_in_executor(
+                    app.state.render_pool, render_gradcam,
+                    rgb_clean, gradcam_heatmap, max_side, include_base64
+                )
+            )
+            
+            # Step 6: Cache the JPEG for /gradcam
+            gradcam_id = uuid.uuid4().hex
+            gradcam_cache.put(gradcam_id, gradcam_bytes)
+            
+            response["gradcam_id"] = gradcam_id
+            response["gradcam_url"] = f"/gradcam/{gradcam_id}"
+            response["gradcam_image_base64"] = gradcam_base64
+        
+        response_cache.put(cache_key, (response, gradcam_bytes))
         
         print("Prediction completed successfully!")
         return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during prediction: {str(e)}")
         raise HTTPException(
@@ -241,6 +520,31 @@ async def predict(file: UploadFile = File(...)) -> Dict:
         )
 
 
+@app.get("/gradcam/{gradcam_id}")
+async def get_gradcam(gradcam_id: str):
+    """
+    Serve a recently generated Grad-CAM overlay as a JPEG image.
+    
+    Args:
+        gradcam_id: Identifier returned by /predict
+    
+    Returns:
+        JPEG image (immutable: each id always refers to the same image)
+    """
+    gradcam_bytes = gradcam_cache.get(gradcam_id)
+    if gradcam_bytes is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Grad-CAM image not found or expired"
+        )
+    
+    return Response(
+        content=gradcam_bytes,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=3600, immutable"}
+    )
+
+
 @app.get("/classes")
 async def get_classes():
     """Get list of supported leaf classes."""
@@ -252,4 +556,13 @@ async def get_classes():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Import string (not the app object) so uvicorn can spawn workers;
+    # loop/http "auto" pick uvloop and httptools when they're installed
+    uvicorn.run(
+        "app:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        loop="auto",
+        http="auto"
+    )
@@ -0,0 +1,158 @@
+"""
+Asynchronous micro-batching for model inference.
+Concurrent requests are grouped into a single batched forward pass.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class BatchScheduler:
+    """
+    Queue that gathers pending inference requests and runs them together.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[..., Union[np.ndarray, Tuple[np.ndarray, ...]]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        max_queue_size: int = 64
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            runner: Blocking function taking one batched array per input
+                (each (N, ...)) and returning an array with N rows, or a
+                tuple of such arrays
+            max_batch_size: Maximum number of requests per forward pass
+            max_wait: Seconds to wait for more requests before running a batch
+            max_queue_size: Pending requests accepted before rejecting new ones
+        """
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._buffers: Optional[List[np.ndarray]] = None
+        self._batch_full: Optional[asyncio.Future] = None
+
+    def start(self):
+        """Start the background batching loop on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background batching loop."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, *inputs: np.ndarray) -> Any:
+        """
+        Queue a single sample and wait for its result.
+
+        Args:
+            *inputs: One array per model input, without batch dimension
+
+        Returns:
+            The runner's output row for this sample (a tuple of rows if
+            the runner returns a tuple)
+
+        Raises:
+            asyncio.QueueFull: If too many requests are already pending
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((inputs, future))
+        
+        # Cut the collection window short once a full batch is waiting
+        full = self._batch_full
+        if (
+            full is not None and not full.done()
+            and self._queue.qsize() >= self.max_batch_size - 1
+        ):
+            full.set_result(None)
+        
+        return await future
+
+    def _fill_buffers(
+        self, samples: List[Sequence[np.ndarray]]
+    ) -> List[np.ndarray]:
+        """
+        Copy queued samples into reusable per-input batch buffers.
+        
+        The buffers are allocated once (for max_batch_size rows) and reused
+        for every batch; the runner finishes before the next batch is
+        filled, so the views returned here are never overwritten in use.
+        
+        Args:
+            samples: One sequence of input arrays per request
+        
+        Returns:
+            One (N, ...) view per model input
+        """
+        first = samples[0]
+        if self._buffers is None or any(
+            buf.shape[1:] != x.shape or buf.dtype != x.dtype
+            for buf, x in zip(self._buffers, first)
+        ):
+            self._buffers = [
+                np.empty((self.max_batch_size, *x.shape), dtype=x.dtype)
+                for x in first
+            ]
+        
+        for row, inputs in enumerate(samples):
+            for buf, x in zip(self._buffers, inputs):
+                np.copyto(buf[row], x)
+        
+        return [buf[:len(samples)] for buf in self._buffers]
+
+    async def _run(self):
+        """Collect requests into batches and dispatch them to the runner."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+
+            # Give concurrent requests a short window to join this batch,
+            # returning as soon as submit() reports the batch is full.
+            # (asyncio.wait_for around queue.get() can swallow cancellation
+            # on Python < 3.12, which would hang stop(); asyncio.wait on a
+            # plain future does not.)
+            if self._queue.qsize() < self.max_batch_size - 1:
+                self._batch_full = loop.create_future()
+                await asyncio.wait({self._batch_full}, timeout=self.max_wait)
+                self._batch_full = None
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # Drop requests whose client has already gone away
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            stacked = self._fill_buffers([inputs for inputs, _ in batch])
+
+            try:
+                outputs = await loop.run_in_executor(None, self.runner, *stacked)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if isinstance(outputs, tuple):
+                outputs = zip(*outputs)
+
+            for row, (_, future) in zip(outputs, batch):
+                if not future.done():
+                    future.set_result(row)
@@ -11,6 +11,8 @@ BASE_DIR = Path(__file__).parent
 
 # Model configuration
 MODEL_PATH = BASE_DIR / "best_model.keras"
+INFERENCE_MODEL_PATH = BASE_DIR / "best_model.tflite"  # Built by convert_model.py
+ONNX_MODEL_PATH = BASE_DIR / "best_model.onnx"  # convert_model.py --onnx, preferred
 KNOWLEDGE_DB_PATH = BASE_DIR / "knowledge_db.json"
 
 # Model settings
@@ -29,6 +31,37 @@ CLASSES = [
 # Grad-CAM settings
 GRADCAM_LAYER = "fused_reduce"  # Last convolutional layer name
 USE_GRADCAM_PLUS_PLUS = True    # Use Grad-CAM++ (vs standard Grad-CAM)
+GRADCAM_JPEG_QUALITY = 85       # JPEG quality for the returned overlay
+GRADCAM_CACHE_SIZE = 32         # Recent overlays kept for /gradcam/{id}
+GRADCAM_MAX_SIDE = 384          # Default longest side of the returned overlay
+GRADCAM_MAX_SIDE_LIMIT = 512    # Upper bound for the max_side query parameter
+RESPONSE_CACHE_SIZE = 256       # Recent /predict responses kept by upload hash
+
+# Inference batching settings
+INFERENCE_MAX_BATCH_SIZE = 8    # Requests merged into one forward pass
+INFERENCE_BATCH_TIMEOUT = 0.01  # Seconds to wait for more requests
+INFERENCE_QUEUE_SIZE = 64       # Pending requests before returning 503
+
+# Load and warm up the model at startup instead of on the first request
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "true").lower() in ("1", "true", "yes")
+
+# XLA JIT compilation: "1" on, "0" off, "auto" only when a GPU is present
+# (on CPU, XLA-compiled convolutions are several times slower for this model)
+XLA_JIT = os.getenv("XLA_JIT", "auto").lower()
+
+# Uvicorn worker processes; each holds its own model replica, so raise
+# this only when memory allows (or when serving a converted TFLite/ONNX model)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Preprocessing worker processes per web worker (run off the event loop)
+PREPROCESS_WORKERS = max(1, ((os.cpu_count() or 2) - 1) // WEB_CONCURRENCY)
+
+# Threads per TFLite interpreter / ONNX Runtime session, split across web
+# workers like the preprocessing pool so they don't each claim every core
+INFERENCE_THREADS = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+# Threads for Grad-CAM overlay rendering and JPEG encoding per web worker
+RENDER_WORKERS = 2
 
 # API settings
 API_TITLE = "TriModal Medicinal Leaf Classifier"
@@ -54,6 +87,7 @@ RELOAD = True  # Set to False in production
 
 # File upload settings
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+MAX_IMAGE_PIXELS = 4096 * 4096    # ~16.7 MP, larger images are rejected
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 
 # Preprocessing settings
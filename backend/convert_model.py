@@ -0,0 +1,204 @@
+"""
+Convert the trained Keras model to TensorFlow Lite or ONNX for inference-only serving.
+
+The Keras model is still loaded by the backend for Grad-CAM, but predictions
+are served from the converted model when it is present.
+
+Usage:
+    python convert_model.py                      # FP16 weights (default)
+    python convert_model.py --int8 path/to/leaves  # INT8, calibrated on leaf images
+    python convert_model.py --int8 path/to/leaves --full-int8  # INT8 ops and input
+    python convert_model.py --onnx               # FP32 ONNX for ONNX Runtime (needs tf2onnx)
+"""
+
+import _tf_bootstrap  # noqa: F401
+
+import argparse
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+import tensorflow as tf
+
+from config import ALLOWED_EXTENSIONS, IMG_SIZE, MODEL_PATH
+from custom_layers import ECA, MobileViTBlock, SpatialAttention
+
+
+def representative_dataset(
+    image_dir: str, limit: int = 100
+) -> Iterator[List[np.ndarray]]:
+    """
+    Yield preprocessed model inputs for INT8 calibration.
+
+    Args:
+        image_dir: Directory containing sample leaf images
+        limit: Maximum number of images to use
+
+    Yields:
+        List of inputs [rgb, vein, texture], each (1, 224, 224, 3) float32
+    """
+    # Imported here so FP16 conversion doesn't need rembg/skimage
+    from preprocessing import preprocess_all_modalities
+
+    paths = sorted(
+        p for p in Path(image_dir).iterdir()
+        if p.suffix.lower() in ALLOWED_EXTENSIONS
+    )[:limit]
+
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in {image_dir}")
+
+    for path in paths:
+        modalities = preprocess_all_modalities(path.read_bytes(), IMG_SIZE)
+        yield [
+            np.expand_dims(img.astype(np.float32), axis=0)
+            for img in modalities
+        ]
+
+
+def load_keras_model(model_path: str) -> tf.keras.Model:
+    """
+    Load the Keras model with its output projections fused, as served.
+
+    Args:
+        model_path: Path to the saved Keras model (.keras file)
+
+    Returns:
+        Loaded Keras model
+    """
+    model = tf.keras.models.load_model(
+        model_path,
+        custom_objects={
+            'ECA': ECA,
+            'SpatialAttention': SpatialAttention,
+            'MobileViTBlock': MobileViTBlock
+        },
+        compile=False
+    )
+    for layer in model.layers:
+        if isinstance(layer, MobileViTBlock):
+            layer.fuse_output_projection()
+    return model
+
+
+def convert(
+    model_path: str,
+    output_path: str,
+    int8_image_dir: str = None,
+    full_int8: bool = False
+) -> None:
+    """
+    Convert a Keras model to TFLite with post-training quantization.
+
+    Args:
+        model_path: Path to the saved Keras model (.keras file)
+        output_path: Destination .tflite path
+        int8_image_dir: If set, quantize weights to INT8 using images from
+            this directory as the representative dataset; otherwise FP16
+        full_int8: With int8_image_dir, restrict the model to INT8 builtin
+            kernels and take uint8 images as input, so no float ops remain
+            on the hot path (the output stays float32 probabilities)
+    """
+    if full_int8 and not int8_image_dir:
+        raise ValueError("full_int8 requires int8_image_dir for calibration")
+    
+    model = load_keras_model(model_path)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if int8_image_dir:
+        converter.representative_dataset = lambda: representative_dataset(
+            int8_image_dir
+        )
+    else:
+        converter.target_spec.supported_types = [tf.float16]
+
+    if full_int8:
+        # Pixels are already uint8, so the input quantization is lossless
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+    else:
+        # Custom layers lower to builtin ops; keep TF ops as a fallback
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS
+        ]
+
+    tflite_model = converter.convert()
+    Path(output_path).write_bytes(tflite_model)
+
+    print(f"Wrote {output_path} ({len(tflite_model) / (1024*1024):.2f} MB)")
+
+
+def convert_onnx(model_path: str, output_path: str, opset: int = 17) -> None:
+    """
+    Export the Keras model's forward pass to ONNX for ONNX Runtime.
+
+    The graph takes float32 inputs named rgb, vein and texture with a
+    dynamic batch dimension and returns the softmax probabilities.
+
+    Args:
+        model_path: Path to the saved Keras model (.keras file)
+        output_path: Destination .onnx path
+        opset: ONNX opset to target
+    """
+    # Only needed offline, so it isn't a serving dependency
+    import tf2onnx
+
+    model = load_keras_model(model_path)
+    input_signature = [
+        tf.TensorSpec((None, *IMG_SIZE, 3), tf.float32, name=name)
+        for name in ("rgb", "vein", "texture")
+    ]
+
+    @tf.function(input_signature=input_signature)
+    def forward(rgb, vein, texture):
+        return model([rgb, vein, texture], training=False)
+
+    onnx_model, _ = tf2onnx.convert.from_function(
+        forward, input_signature=input_signature, opset=opset
+    )
+    serialized = onnx_model.SerializeToString()
+    Path(output_path).write_bytes(serialized)
+
+    print(f"Wrote {output_path} ({len(serialized) / (1024*1024):.2f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument(
+        "--output", default=None,
+        help="Output path (default: next to the model, .tflite or .onnx)"
+    )
+    parser.add_argument(
+        "--int8", metavar="IMAGE_DIR", default=None,
+        help="Quantize to INT8 using leaf images in IMAGE_DIR for calibration"
+    )
+    parser.add_argument(
+        "--full-int8", action="store_true",
+        help="With --int8, use only INT8 kernels and uint8 image inputs"
+    )
+    parser.add_argument(
+        "--onnx", action="store_true",
+        help="Export an FP32 ONNX model for ONNX Runtime instead of TFLite"
+    )
+    args = parser.parse_args()
+
+    if args.full_int8 and not args.int8:
+        parser.error("--full-int8 requires --int8 IMAGE_DIR")
+    if args.onnx and args.int8:
+        parser.error("--onnx can't be combined with --int8")
+
+    suffix = ".onnx" if args.onnx else ".tflite"
+    output = args.output or str(Path(args.model).with_suffix(suffix))
+
+    if args.onnx:
+        convert_onnx(args.model, output)
+    else:
+        convert(args.model, output, args.int8, args.full_int8)
+
+
+if __name__ == "__main__":
+    main()
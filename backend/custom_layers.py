@@ -22,18 +22,22 @@ class ECA(Layer):
         self.k_size = k_size
 
     def build(self, input_shape):
-        # Conv over channel dimension after reshaping to (B, C, 1, 1)
+        # Conv over the channel dimension. Kept as a Conv2D on (B, C, 1, 1)
+        # so saved (k, 1, 1, 1) kernels load unchanged; built explicitly
+        # because call() only reads its kernel.
         self.conv = Conv2D(
             1, kernel_size=(self.k_size, 1), padding="same", use_bias=False
         )
+        self.conv.build((None, input_shape[-1], 1, 1))
         super(ECA, self).build(input_shape)
 
     def call(self, x):
-        y = tf.reduce_mean(x, axis=[1, 2], keepdims=True)  # (B,1,1,C)
-        y = tf.transpose(y, [0, 3, 1, 2])  # (B,C,1,1)
-        y = self.conv(y)
-        y = tf.transpose(y, [0, 2, 3, 1])  # (B,1,1,C)
-        y = tf.sigmoid(y)
+        y = tf.reduce_mean(x, axis=[1, 2])  # (B,C)
+        # Same kernel applied as a 1D conv along C - no transposes needed
+        y = tf.nn.conv1d(
+            y[:, :, tf.newaxis], self.conv.kernel[:, 0], stride=1, padding="SAME"
+        )  # (B,C,1)
+        y = tf.sigmoid(y[:, tf.newaxis, tf.newaxis, :, 0])  # (B,1,1,C)
         return x * y
 
     def get_config(self):
@@ -59,10 +63,11 @@ class SpatialAttention(Layer):
         super(SpatialAttention, self).build(input_shape)
 
     def call(self, x):
-        avg_pool = tf.reduce_mean(x, axis=-1, keepdims=True)
-        max_pool = tf.reduce_max(x, axis=-1, keepdims=True)
-        concat = tf.concat([avg_pool, max_pool], axis=-1)
-        attn = self.conv(concat)
+        # Both channel reductions written straight into one (B,H,W,2) tensor
+        pooled = tf.stack(
+            [tf.reduce_mean(x, axis=-1), tf.reduce_max(x, axis=-1)], axis=-1
+        )
+        attn = self.conv(pooled)
         return x * attn
 
     def get_config(self):
@@ -77,13 +82,19 @@ class MobileViTBlock(Layer):
     """
     
     def __init__(
-        self, num_heads=2, projection_dim=64, patch_h=1, patch_w=1, **kwargs
+        self, num_heads=2, projection_dim=64, patch_h=1, patch_w=1,
+        key_dim=None, **kwargs
     ):
         super(MobileViTBlock, self).__init__(**kwargs)
         self.num_heads = num_heads
         self.projection_dim = projection_dim
+        # Per-head Q/K/V size. The shipped model was trained with
+        # key_dim=projection_dim; new models should use
+        # projection_dim // num_heads, which halves attention FLOPs
+        self.key_dim = key_dim if key_dim is not None else projection_dim
         self.patch_h = patch_h
         self.patch_w = patch_w
+        self._fused_projection = None
 
     def build(self, input_shape):
         # input_shape: (B, H, W, C_in)
@@ -95,7 +106,7 @@ class MobileViTBlock(Layer):
         )
         self.norm = LayerNormalization(epsilon=1e-6)
         self.mha = MultiHeadAttention(
-            num_heads=self.num_heads, key_dim=self.projection_dim
+            num_heads=self.num_heads, key_dim=self.key_dim
         )
         self.ffn = tf.keras.Sequential([
             Dense(self.projection_dim * 2, activation="relu"),
@@ -116,14 +127,15 @@ class MobileViTBlock(Layer):
     def call(self, x):
         # Project channels
         y = self.proj_conv(x)  # (B,H,W,proj_dim)
-        shape = tf.shape(y)
-        b = shape[0]
-        h = shape[1]
-        w = shape[2]
-        c = shape[3]
+        _, h, w, c = y.shape
+        if None in (h, w, c):
+            shape = tf.shape(y)
+            h, w, c = shape[1], shape[2], shape[3]
 
-        # Flatten spatial dimension for token processing (B, H*W, C)
-        y_flat = tf.reshape(y, [b, h * w, c])
+        # Flatten spatial dimension for token processing (B, H*W, C).
+        # With static H, W, C the reshapes are pure views in the graph,
+        # with no Shape/StridedSlice ops computed on every call.
+        y_flat = tf.reshape(y, [-1, h * w, c])
 
         # Map to token dim used by MHA
         y_tokens = self.to_tokens(y_flat)  # (B, N, proj_dim)
@@ -132,18 +144,46 @@ class MobileViTBlock(Layer):
         y_tokens = y_tokens + attn
         y_tokens = y_tokens + self.ffn(y_tokens)
 
+        if self._fused_projection is not None:
+            # to_patches + proj_back folded into a single matmul
+            kernel, bias = self._fused_projection
+            y_out = tf.einsum("bnc,cd->bnd", y_tokens, kernel) + bias
+            return tf.reshape(y_out, [-1, h, w, c])  # (B, H, W, proj_dim)
+
         # Map tokens back to spatial embeddings and reshape to H,W
         y_out = self.to_patches(y_tokens)  # (B, N, proj_dim)
-        y_out = tf.reshape(y_out, [b, h, w, c])  # (B, H, W, proj_dim)
+        y_out = tf.reshape(y_out, [-1, h, w, c])  # (B, H, W, proj_dim)
         y_out = self.proj_back(y_out)  # (B, H, W, proj_dim)
 
         return y_out
 
+    def fuse_output_projection(self):
+        """
+        Fold the to_patches Dense and the 1x1 proj_back conv into one matmul.
+
+        Both are linear maps over the channel axis with nothing in between
+        but a reshape, so W = W_patch @ W_back and b = b_patch @ W_back + b_back
+        give identical outputs with one fewer H*W x C x C matmul. Must be
+        called after weights are loaded; to_tokens can't be folded since a
+        ReLU and the residual path sit between it and its neighbours.
+        """
+        w_patch = tf.convert_to_tensor(self.to_patches.kernel)  # (C, C)
+        b_patch = tf.convert_to_tensor(self.to_patches.bias)  # (C,)
+        w_back = tf.convert_to_tensor(self.proj_back.kernel)[0, 0]  # (C, C)
+        b_back = tf.convert_to_tensor(self.proj_back.bias)  # (C,)
+
+        kernel = tf.matmul(w_patch, w_back)
+        bias = tf.linalg.matvec(w_back, b_patch, transpose_a=True) + b_back
+        # Kept as NumPy so traced graphs embed them as constants rather than
+        # captured inputs (which exporters such as tf2onnx can't freeze)
+        self._fused_projection = (kernel.numpy(), bias.numpy())
+
     def get_config(self):
         config = super(MobileViTBlock, self).get_config()
         config.update({
             "num_heads": self.num_heads,
             "projection_dim": self.projection_dim,
+            "key_dim": self.key_dim,
             "patch_h": self.patch_h,
             "patch_w": self.patch_w,
         })
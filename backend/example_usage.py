@@ -135,7 +135,7 @@ def example_usage():
             output_dir = Path("output")
             output_dir.mkdir(exist_ok=True)
             
-            gradcam_path = output_dir / f"gradcam_{result['predicted_class']}.png"
+            gradcam_path = output_dir / f"gradcam_{result['predicted_class']}.jpg"
             client.save_gradcam(result['gradcam_image_base64'], str(gradcam_path))
             print(f"\n🎨 Grad-CAM++ heatmap saved to: {gradcam_path}")
         
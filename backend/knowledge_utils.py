@@ -2,9 +2,11 @@
 Knowledge database utilities for retrieving plant information.
 """
 
-import json
-from typing import Dict, Optional
 from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Optional
+
+import orjson
 
 
 class KnowledgeDB:
@@ -12,6 +14,14 @@ class KnowledgeDB:
     Handler for medicinal plant knowledge database.
     """
     
+    _MISSING_INFO = {
+        "Scientific Name": "Information not available",
+        "Medicinal Uses": [],
+        "Active Compounds": [],
+        "Precautions": "Information not available",
+        "Sources": []
+    }
+    
     def __init__(self, db_path: str):
         """
         Initialize the knowledge database.
@@ -20,7 +30,9 @@ class KnowledgeDB:
             db_path: Path to the knowledge_db.json file
         """
         self.db_path = Path(db_path)
-        self.knowledge = self._load_db()
+        # Read-only views: safe to share across request threads unlocked
+        self.knowledge = MappingProxyType(self._load_db())
+        self._formatted = MappingProxyType(self._format_all())
     
     def _load_db(self) -> Dict:
         """
@@ -29,8 +41,8 @@ class KnowledgeDB:
         Returns:
             Dictionary containing plant information
         """
-        with open(self.db_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(self.db_path, 'rb') as f:
+            return orjson.loads(f.read())
     
     def get_plant_info(self, class_name: str) -> Optional[Dict]:
         """
@@ -48,27 +60,31 @@ class KnowledgeDB:
         """
         Get formatted plant information ready for API response.
         
+        The classes are fixed, so this is a lookup into the entries built
+        once by _format_all; callers must not modify the returned dict.
+        
         Args:
             class_name: Name of the plant class
         
         Returns:
-            Dictionary with formatted information, or empty dict if not found
+            Dictionary with formatted information, or placeholder values if not found
         """
-        info = self.get_plant_info(class_name)
-        
-        if info is None:
-            return {
-                "Scientific Name": "Information not available",
-                "Medicinal Uses": [],
-                "Active Compounds": [],
-                "Precautions": "Information not available",
-                "Sources": []
-            }
+        return self._formatted.get(class_name, self._MISSING_INFO)
+    
+    def _format_all(self) -> Dict[str, Dict]:
+        """
+        Format every plant entry for API responses.
         
+        Returns:
+            Dictionary mapping class name to formatted information
+        """
         return {
-            "Scientific Name": info.get("Scientific Name", "N/A"),
-            "Medicinal Uses": info.get("Medicinal Uses", []),
-            "Active Compounds": info.get("Active Compounds", []),
-            "Precautions": info.get("Precautions", "N/A"),
-            "Sources": info.get("Sources", [])
+            class_name: {
+                "Scientific Name": info.get("Scientific Name", "N/A"),
+                "Medicinal Uses": info.get("Medicinal Uses", []),
+                "Active Compounds": info.get("Active Compounds", []),
+                "Precautions": info.get("Precautions", "N/A"),
+                "Sources": info.get("Sources", [])
+            }
+            for class_name, info in self.knowledge.items()
         }
@@ -2,25 +2,37 @@
 Model utilities for loading and running inference with memory optimization.
 """
 
-import os
+import sys
+import threading
 import cv2
 import numpy as np
 
-# TensorFlow memory optimization
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-os.environ['TF_FORCE_GPU_ALLOW_GROWTH'] = 'true'
+import _tf_bootstrap  # noqa: F401
+from config import INFERENCE_THREADS, XLA_JIT
 
 import tensorflow as tf
-from tensorflow.keras.applications.mobilenet_v3 import preprocess_input
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# XLA is applied per function (jit_compile on the forward-only inference
+# pass) rather than globally; the Grad-CAM pass, which differentiates
+# through the grad model, is not XLA-compiled (only the Grad-CAM++ weight
+# math on its gradients is, in xai)
+USE_XLA = XLA_JIT == "1" or (
+    XLA_JIT == "auto" and bool(tf.config.list_physical_devices('GPU'))
+)
 
 # Configure TensorFlow for low memory
-tf.config.optimizer.set_jit(False)  # Disable XLA
 tf.config.threading.set_intra_op_parallelism_threads(2)
 tf.config.threading.set_inter_op_parallelism_threads(2)
+tf.config.optimizer.set_experimental_options({
+    "layout_optimizer": True,
+    "remapping": True,
+    "arithmetic_optimization": True,
+})
 
 # Import custom layers to register them before model loading
 from custom_layers import ECA, SpatialAttention, MobileViTBlock
+from xai import build_grad_model, compute_gradcam
 
 
 class TriModalClassifier:
@@ -28,12 +40,24 @@ class TriModalClassifier:
     Wrapper class for tri-modal leaf classification model with memory optimization.
     """
     
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        inference_model_path: Optional[str] = None,
+        gradcam_layer: str = "fused_reduce",
+        warmup_batch_sizes: Sequence[int] = (1,)
+    ):
         """
         Initialize the classifier with memory-efficient settings.
         
         Args:
             model_path: Path to the saved Keras model (.keras file)
+            inference_model_path: Optional converted model (.tflite or .onnx)
+                used for all predictions, with or without Grad-CAM; the Keras
+                model is then only used for the heatmaps
+            gradcam_layer: Name of the layer Grad-CAM is computed on
+            warmup_batch_sizes: Batch sizes to run once at load time, e.g.
+                every size from 1 to the batch scheduler's maximum
         """
         print(f"Loading model from {model_path} with memory optimization...")
         
@@ -53,7 +77,56 @@ class TriModalClassifier:
         
         print(f"Model loaded successfully (memory-optimized mode)")
         
-        self.classes = [
+        # Fold redundant linear projections now that weights are loaded
+        for layer in self.model.layers:
+            if isinstance(layer, MobileViTBlock):
+                layer.fuse_output_projection()
+        
+        self.img_size = (224, 224)
+        input_spec = tf.TensorSpec((None, *self.img_size, 3), tf.float32)
+        
+        # Graph-mode forward pass, traced once into a ConcreteFunction that
+        # is called directly, skipping tf.function's per-call argument
+        # binding and trace-cache lookup.
+        # With XLA the whole graph is compiled so the small element-wise ops
+        # in ECA / SpatialAttention / MobileViT are fused into few kernels.
+        self._infer = tf.function(
+            self._forward,
+            input_signature=[input_spec] * 3,
+            jit_compile=USE_XLA
+        ).get_concrete_function()
+        
+        self.interpreter = None
+        self.session = None
+        if inference_model_path and str(inference_model_path).endswith(".tflite"):
+            self._load_tflite(str(inference_model_path))
+        elif inference_model_path and str(inference_model_path).endswith(".onnx"):
+            self._load_onnx(str(inference_model_path))
+        self._has_inference_model = (
+            self.interpreter is not None or self.session is not None
+        )
+        
+        # Grad-CAM sub-model and traced Grad-CAM pass, built once per
+        # process (kept out of XLA, see USE_XLA). With a converted model the
+        # pass only explains the converted model's top class; otherwise it
+        # also provides the predictions.
+        self._grad_models: Dict[str, tf.keras.Model] = {}
+        self.grad_model = self.get_grad_model(gradcam_layer)
+        if self._has_inference_model:
+            self._gradcam_fn = tf.function(
+                self._gradcam_for_classes,
+                input_signature=[input_spec] * 3 + [
+                    tf.TensorSpec((None,), tf.int64)
+                ]
+            ).get_concrete_function()
+        else:
+            self._gradcam_fn = tf.function(
+                self._forward_with_gradcam,
+                input_signature=[input_spec] * 3
+            ).get_concrete_function()
+        
+        # Interned so lookups keyed by these names compare by identity
+        self.classes = tuple(sys.intern(name) for name in (
             "alpinia_galanga",
             "azadirachta_indica",
             "basella_alba",
@@ -61,8 +134,216 @@ class TriModalClassifier:
             "nerium_oleander",
             "plectranthus_amboinicus",
             "trigonella_foenum_graecum"
+        ))
+        
+        self.warmup(warmup_batch_sizes)
+    
+    def warmup(self, batch_sizes: Sequence[int] = (1,)):
+        """
+        Run every inference path once on dummy inputs.
+        
+        Tracing, XLA compilation, cuDNN autotuning, oneDNN primitive
+        creation and TFLite / ONNX Runtime buffer allocation then happen
+        here instead of on the first request. Most of these are per input
+        shape, so every batch size the server will send should be run once
+        (each gets its own TFLite interpreter).
+        
+        Args:
+            batch_sizes: Batch sizes to warm up
+        """
+        for batch_size in sorted(set(batch_sizes)):
+            dummy = np.zeros((batch_size, *self.img_size, 3), dtype=np.float32)
+            self.predict_with_gradcam(dummy, dummy, dummy)
+            self.predict_batch(dummy, dummy, dummy)
+    
+    def _load_tflite(self, tflite_path: str):
+        """
+        Load a converted TFLite model for inference.
+        
+        Args:
+            tflite_path: Path to the .tflite file produced by convert_model.py
+        """
+        print(f"Loading TFLite inference model from {tflite_path}...")
+        
+        self._tflite_path = tflite_path
+        self._tflite_op_resolver = tf.lite.experimental.OpResolverType.AUTO
+        try:
+            self.interpreter = self._new_tflite_interpreter(1)
+        except RuntimeError:
+            # XNNPACK can't prepare some fully-quantized graphs; the
+            # reference builtin kernels handle them
+            print("XNNPACK delegate unavailable, using builtin TFLite kernels")
+            self._tflite_op_resolver = (
+                tf.lite.experimental.OpResolverType
+                .BUILTIN_WITHOUT_DEFAULT_DELEGATES
+            )
+            self.interpreter = self._new_tflite_interpreter(1)
+        
+        # TFLite doesn't preserve the Keras input order, so match by name
+        input_details = self.interpreter.get_input_details()
+        self._tflite_inputs = []
+        for position, keras_input in enumerate(self.model.inputs):
+            name = keras_input.name.split(":")[0]
+            matches = [d for d in input_details if name in d["name"]]
+            self._tflite_inputs.append(
+                matches[0] if matches else input_details[position]
+            )
+        
+        output_details = self.interpreter.get_output_details()[0]
+        self._tflite_output = output_details["index"]
+        self._tflite_output_quantization = (
+            output_details["quantization"]
+            if output_details["dtype"] != np.float32 else None
+        )
+        
+        # One interpreter per batch size, each allocated once, so a change
+        # of batch size never resizes and re-allocates tensors on the
+        # request path. An interpreter holds per-invocation state and isn't
+        # thread-safe, so each has its own lock.
+        self._tflite_interpreters: Dict[int, tuple] = {
+            1: (self.interpreter, threading.Lock())
+        }
+        self._tflite_interpreters_lock = threading.Lock()
+        
+        print("TFLite inference model loaded")
+    
+    def _new_tflite_interpreter(self, batch_size: int):
+        """
+        Create a TFLite interpreter allocated for a fixed batch size.
+        
+        Args:
+            batch_size: Batch size the interpreter's inputs are sized for
+        
+        Returns:
+            tf.lite.Interpreter with tensors allocated
+        """
+        interpreter = tf.lite.Interpreter(
+            model_path=self._tflite_path,
+            num_threads=INFERENCE_THREADS,
+            experimental_op_resolver_type=self._tflite_op_resolver
+        )
+        if batch_size != 1:
+            for detail in interpreter.get_input_details():
+                interpreter.resize_tensor_input(
+                    detail["index"], [batch_size, *self.img_size, 3]
+                )
+        interpreter.allocate_tensors()
+        return interpreter
+    
+    def _get_tflite_interpreter(self, batch_size: int):
+        """Get the interpreter (and its lock) for a batch size, creating it on first use."""
+        entry = self._tflite_interpreters.get(batch_size)
+        if entry is None:
+            with self._tflite_interpreters_lock:
+                entry = self._tflite_interpreters.get(batch_size)
+                if entry is None:
+                    entry = (
+                        self._new_tflite_interpreter(batch_size),
+                        threading.Lock()
+                    )
+                    self._tflite_interpreters[batch_size] = entry
+        return entry
+    
+    def _load_onnx(self, onnx_path: str):
+        """
+        Load a converted ONNX model into an ONNX Runtime CPU session.
+        
+        Args:
+            onnx_path: Path to the .onnx file produced by convert_model.py --onnx
+        """
+        # Imported here so TF/TFLite-only deployments don't load ORT
+        import onnxruntime as ort
+        
+        print(f"Loading ONNX inference model from {onnx_path}...")
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        options.intra_op_num_threads = INFERENCE_THREADS
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        
+        # Inputs are named rgb/vein/texture by the exporter; fall back to
+        # position for models exported some other way
+        input_names = [node.name for node in self.session.get_inputs()]
+        self._onnx_inputs = [
+            name if name in input_names else input_names[position]
+            for position, name in enumerate(("rgb", "vein", "texture"))
         ]
-        self.img_size = (224, 224)
+        self._onnx_output = self.session.get_outputs()[0].name
+        
+        print("ONNX inference model loaded")
+    
+    def _run_tflite(self, inputs: List[np.ndarray]) -> np.ndarray:
+        """Run the TFLite interpreter on preprocessed [rgb, vein, texture] inputs."""
+        interpreter, lock = self._get_tflite_interpreter(inputs[0].shape[0])
+        with lock:
+            for detail, img in zip(self._tflite_inputs, inputs):
+                interpreter.set_tensor(
+                    detail["index"], self._quantize_input(img, detail)
+                )
+            interpreter.invoke()
+            output = interpreter.get_tensor(self._tflite_output)
+        
+        if self._tflite_output_quantization is not None:
+            scale, zero_point = self._tflite_output_quantization
+            return (output.astype(np.float32) - zero_point) * scale
+        return output.copy()
+    
+    @staticmethod
+    def _quantize_input(img: np.ndarray, detail: dict) -> np.ndarray:
+        """Convert a float input to the interpreter's (possibly integer) input type."""
+        dtype = detail["dtype"]
+        if dtype == np.float32:
+            return img
+        
+        # Fully quantized model (convert_model.py --full-int8)
+        scale, zero_point = detail["quantization"]
+        info = np.iinfo(dtype)
+        quantized = np.round(img / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(dtype)
+    
+    def get_grad_model(self, layer_name: str) -> tf.keras.Model:
+        """
+        Get the Grad-CAM sub-model for a layer, building it on first use.
+        
+        Args:
+            layer_name: Name of the layer Grad-CAM is computed on
+        
+        Returns:
+            Keras model with outputs [layer activations, predictions]
+        """
+        if layer_name not in self._grad_models:
+            self._grad_models[layer_name] = build_grad_model(self.model, layer_name)
+        return self._grad_models[layer_name]
+    
+    def _forward(self, rgb: tf.Tensor, vein: tf.Tensor, texture: tf.Tensor) -> tf.Tensor:
+        """Inference-mode forward pass wrapped by the tf.function in __init__."""
+        predictions = self.model([rgb, vein, texture], training=False)
+        
+        # Handle potential tuple output
+        if isinstance(predictions, (list, tuple)):
+            predictions = predictions[0]
+        
+        return predictions
+    
+    def _forward_with_gradcam(
+        self, rgb: tf.Tensor, vein: tf.Tensor, texture: tf.Tensor
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """Fused prediction + Grad-CAM++ pass wrapped by the tf.function in __init__."""
+        return compute_gradcam(self.grad_model, [rgb, vein, texture])
+    
+    def _gradcam_for_classes(
+        self, rgb: tf.Tensor, vein: tf.Tensor, texture: tf.Tensor,
+        class_index: tf.Tensor
+    ) -> tf.Tensor:
+        """Grad-CAM++ pass for given target classes wrapped by the tf.function in __init__."""
+        _, heatmaps = compute_gradcam(
+            self.grad_model, [rgb, vein, texture], class_index=class_index
+        )
+        return heatmaps
     
     def preprocess_for_model(
         self, rgb: np.ndarray, vein: np.ndarray, texture: np.ndarray
@@ -78,21 +359,21 @@ class TriModalClassifier:
         Returns:
             List of preprocessed arrays [rgb, vein, texture], each (1, 224, 224, 3)
         """
-        preprocessed = []
+        width, height = self.img_size
+        batch = np.empty((3, height, width, 3), dtype=np.float32)
         
-        for img in [rgb, vein, texture]:
-            # Resize to model input size
-            img_resized = cv2.resize(img, self.img_size)
-            
-            # Apply MobileNetV3 preprocessing
-            img_preprocessed = preprocess_input(img_resized.astype(np.float32))
+        for i, img in enumerate((rgb, vein, texture)):
+            # Resize to model input size (the pipeline usually already has)
+            if img.shape[:2] != (height, width):
+                img = cv2.resize(img, self.img_size)
             
-            # Add batch dimension
-            img_batch = np.expand_dims(img_preprocessed, axis=0)
-            
-            preprocessed.append(img_batch)
+            # Cast straight into the shared buffer. MobileNetV3's
+            # preprocess_input is a pass-through (rescaling is built into
+            # the model), so the raw [0, 255] values are the model input.
+            batch[i] = img
         
-        return preprocessed
+        # Views with a batch dimension, no copies
+        return [batch[0:1], batch[1:2], batch[2:3]]
     
     def predict(
         self, rgb: np.ndarray, vein: np.ndarray, texture: np.ndarray
@@ -114,14 +395,68 @@ class TriModalClassifier:
         preprocessed_inputs = self.preprocess_for_model(rgb, vein, texture)
         
         # Run inference
-        predictions = self.model.predict(preprocessed_inputs, verbose=0)
-        
-        # Handle potential tuple output
-        if not isinstance(predictions, np.ndarray):
-            predictions = predictions[0]
+        predictions = self.predict_batch(*preprocessed_inputs)
         
         return predictions, preprocessed_inputs
     
+    def predict_batch(
+        self, rgb: np.ndarray, vein: np.ndarray, texture: np.ndarray
+    ) -> np.ndarray:
+        """
+        Run inference on a batch of already preprocessed inputs.
+        
+        Args:
+            rgb: Preprocessed RGB batch (N, 224, 224, 3)
+            vein: Preprocessed vein batch (N, 224, 224, 3)
+            texture: Preprocessed texture batch (N, 224, 224, 3)
+        
+        Returns:
+            Softmax probabilities array (N, num_classes)
+        """
+        if self.interpreter is not None:
+            return self._run_tflite([rgb, vein, texture])
+        
+        if self.session is not None:
+            # InferenceSession.run is thread-safe, so no lock is needed
+            feed = dict(zip(self._onnx_inputs, (rgb, vein, texture)))
+            return self.session.run([self._onnx_output], feed)[0]
+        
+        return self._infer(rgb, vein, texture).numpy()
+    
+    def predict_with_gradcam(
+        self, rgb: np.ndarray, vein: np.ndarray, texture: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run inference and Grad-CAM++ together on a batch of preprocessed inputs.
+        
+        With a converted model loaded, predictions come from it (the same
+        probabilities predict_batch returns) and the Keras pass only computes
+        the heatmaps, for the converted model's top classes. Without one,
+        predictions and heatmaps come from the same forward pass through the
+        Grad-CAM sub-model, so the network isn't run a second time for the
+        explanation. Each heatmap targets its sample's predicted class.
+        
+        Args:
+            rgb: Preprocessed RGB batch (N, 224, 224, 3)
+            vein: Preprocessed vein batch (N, 224, 224, 3)
+            texture: Preprocessed texture batch (N, 224, 224, 3)
+        
+        Returns:
+            Tuple of (predictions, heatmaps)
+            - predictions: Softmax probabilities array (N, num_classes)
+            - heatmaps: uint8 Grad-CAM++ heatmaps (N, h, w) scaled to [0, 255]
+        """
+        if self._has_inference_model:
+            predictions = self.predict_batch(rgb, vein, texture)
+            heatmaps = self._gradcam_fn(
+                rgb, vein, texture, np.argmax(predictions, axis=-1)
+            )
+            return predictions, heatmaps.numpy()
+        
+        predictions, heatmaps = self._gradcam_fn(rgb, vein, texture)
+        
+        return predictions.numpy(), heatmaps.numpy()
+    
     def get_top_predictions(
         self, predictions: np.ndarray, top_k: int = 3
     ) -> List[dict]:
@@ -133,16 +468,24 @@ class TriModalClassifier:
             top_k: Number of top predictions to return
         
         Returns:
-            List of dicts with 'class' and 'confidence' keys
+            List of dicts with 'class', 'confidence' and 'index' (class index) keys
         """
         probs = predictions[0]
-        top_indices = np.argsort(probs)[::-1][:top_k]
+        
+        if top_k == 1:
+            top_indices = [int(np.argmax(probs))]
+        else:
+            # Select the k largest without sorting every class, then order them
+            top_k = min(top_k, len(probs))
+            candidates = np.argpartition(probs, -top_k)[-top_k:]
+            top_indices = candidates[np.argsort(probs[candidates])[::-1]]
         
         top_predictions = []
         for idx in top_indices:
             top_predictions.append({
                 "class": self.classes[idx],
-                "confidence": float(probs[idx])
+                "confidence": float(probs[idx]),
+                "index": int(idx)
             })
         
         return top_predictions
@@ -5,68 +5,312 @@ Handles background removal, vein enhancement, and texture enhancement.
 
 import cv2
 import numpy as np
+import onnxruntime as ort
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from PIL import Image
-from rembg import remove
-from skimage.filters import frangi
-from skimage import exposure
-from skimage.feature import local_binary_pattern
-from skimage.filters import gabor
+from typing import Optional
+from PIL import Image, ImageOps
+from rembg import new_session, remove
+from scipy import fft
 from skimage.util import img_as_ubyte
-from skimage.filters import unsharp_mask
 
+try:
+    from turbojpeg import TJPF_RGB, TurboJPEG
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    # PyTurboJPEG or the libturbojpeg shared library isn't installed
+    _turbo_jpeg = None
 
-def remove_background(image_bytes: bytes) -> np.ndarray:
+try:
+    import numba
+except ImportError:
+    # LBP falls back to a NumPy implementation
+    numba = None
+
+# Uploads are decoded at reduced size where the codec allows it, keeping the
+# shorter side at least this long (background removal runs at this size)
+DECODE_MIN_SIDE = 1024
+
+# Gabor filter bank used by texture_enhancement, as (frequency, theta) pairs
+GABOR_FREQUENCIES = (0.2, 0.3)
+GABOR_ORIENTATIONS = (0, np.pi / 4, np.pi / 2, 3 * np.pi / 4)
+GABOR_BANK = tuple(
+    (freq, theta) for theta in GABOR_ORIENTATIONS for freq in GABOR_FREQUENCIES
+)
+
+# Vein contrast enhancement: CLAHE objects keep scratch buffers between
+# apply() calls, so each thread gets its own (created on first use);
+# the top-hat structuring element is read-only and shared
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+_clahe_local = threading.local()
+_TOPHAT_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# Frangi vesselness scales used by vein_enhancement (what skimage's
+# frangi(scale_range=(1, 4), scale_step=1) expands to) and blobness weight
+FRANGI_SIGMAS = (1, 2, 3)
+FRANGI_BETA = 0.5
+
+# Local binary pattern used by texture_enhancement ("uniform" method)
+LBP_RADIUS = 2
+LBP_POINTS = 8 * LBP_RADIUS
+
+# rembg segmentation model, and its ONNX Runtime session (created on first
+# use, then shared by every call in the process)
+REMBG_MODEL = "u2net"
+# Execution providers for the session in order of preference; those not
+# installed are skipped (CUDA needs the onnxruntime-gpu package)
+REMBG_PROVIDERS = ("CUDAExecutionProvider", "CPUExecutionProvider")
+_rembg_session = None
+
+# Threads per FFT (-1: all cores); init_worker drops this to 1
+_fft_workers = -1
+
+# Runs the vein branch alongside the texture branch of the same image
+# (threads start on first use)
+_branch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="enhance")
+
+
+def init_worker():
     """
-    Remove background from an image using rembg library.
+    Initializer for preprocessing worker processes.
+    
+    Importing this module loads OpenCV, scikit-image and rembg once per
+    worker, and the rembg model is loaded here rather than on the first
+    request; OpenCV and the FFTs are limited to one thread so parallel
+    workers don't oversubscribe the CPU.
+    """
+    global _fft_workers
+    cv2.setNumThreads(1)
+    _fft_workers = 1
+    get_rembg_session()
+    if _lbp_uniform_jit is not None:
+        numba.set_num_threads(1)
+        # Compile (or load from cache) now rather than on the first request
+        local_binary_pattern_uniform(np.zeros((8, 8), dtype=np.uint8))
+
+
+def decode_image(image_bytes: bytes, min_side: int = DECODE_MIN_SIDE) -> np.ndarray:
+    """
+    Decode an uploaded image to RGB, downscaling during decode when possible.
+    
+    JPEGs are decoded with libjpeg-turbo's DCT scaling (1/2, 1/4, 1/8, ...),
+    which skips most of the IDCT work for large photos. Without PyTurboJPEG,
+    PIL's draft mode does the same through libjpeg; other formats are
+    decoded at full size. EXIF orientation is applied, as rembg would do
+    for encoded input.
     
     Args:
         image_bytes: Raw image bytes (from uploaded file)
+        min_side: Smallest acceptable length of the shorter side after scaling
+    
+    Returns:
+        RGB image array (H, W, 3)
+    """
+    if (
+        _turbo_jpeg is not None
+        and image_bytes[:2] == b"\xff\xd8"
+        and _exif_orientation(image_bytes) in (None, 1)
+    ):
+        try:
+            width, height, _, _ = _turbo_jpeg.decode_header(image_bytes)
+            # Strongest reduction that keeps the shorter side >= min_side
+            scaling_factor = min(
+                (
+                    factor for factor in _turbo_jpeg.scaling_factors
+                    if factor[0] <= factor[1]
+                    and min(width, height) * factor[0] >= min_side * factor[1]
+                ),
+                key=lambda factor: factor[0] / factor[1],
+                default=(1, 1)
+            )
+            return _turbo_jpeg.decode(
+                image_bytes, pixel_format=TJPF_RGB, scaling_factor=scaling_factor
+            )
+        except OSError:
+            pass  # e.g. CMYK JPEG; let PIL handle it
+    
+    with Image.open(BytesIO(image_bytes)) as img:
+        scale = min_side / min(img.size)
+        if scale < 1:
+            # Only affects JPEGs: decode at the smallest DCT scale >= size
+            img.draft("RGB", (int(np.ceil(img.width * scale)),
+                              int(np.ceil(img.height * scale))))
+        # asarray wraps PIL's exported buffer instead of copying it again;
+        # the result is read-only, which the pipeline never writes to
+        return np.asarray(ImageOps.exif_transpose(img).convert("RGB"))
+
+
+def _exif_orientation(image_bytes: bytes):
+    """Read the EXIF orientation tag from the image header (None if absent)."""
+    with Image.open(BytesIO(image_bytes)) as img:
+        return img.getexif().get(0x0112)
+
+
+def get_rembg_session():
+    """Get the process's rembg session, loading the model on first use."""
+    global _rembg_session
+    if _rembg_session is None:
+        available = ort.get_available_providers()
+        providers = [p for p in REMBG_PROVIDERS if p in available]
+        _rembg_session = new_session(REMBG_MODEL, providers=providers)
+    return _rembg_session
+
+
+def get_clahe():
+    """Get the calling thread's CLAHE object for vein enhancement."""
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(
+            clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID
+        )
+        _clahe_local.clahe = clahe
+    return clahe
+
+
+def remove_background(rgb_image: np.ndarray) -> np.ndarray:
+    """
+    Remove background from an image using rembg library.
+    
+    Args:
+        rgb_image: Decoded RGB image array (H, W, 3)
     
     Returns:
         RGB image array (H, W, 3) with background removed (black background)
     """
-    # Remove background
-    removed_bg = remove(image_bytes)
+    # Remove background (array in, RGBA array out; no re-encoding). Without
+    # an explicit session rembg would load the ONNX model on every call.
+    removed_bg = remove(rgb_image, session=get_rembg_session())
     
-    # Convert bytes back to an image
-    img = Image.open(BytesIO(removed_bg)).convert("RGBA")
+    # Composite onto black: rgb * alpha / 255, rounded as PIL's
+    # alpha_composite does, in one saturating SIMD pass
+    rgb_img = cv2.cvtColor(removed_bg, cv2.COLOR_RGBA2RGB)
+    alpha = cv2.cvtColor(removed_bg[:, :, 3], cv2.COLOR_GRAY2RGB)
     
-    # Create a black background
-    black_bg = Image.new("RGBA", img.size, (0, 0, 0, 255))
+    return cv2.multiply(rgb_img, alpha, dst=rgb_img, scale=1 / 255)
+
+
+def resize_interpolation(source_size: tuple, target_size: tuple = (224, 224)) -> int:
+    """
+    Choose the OpenCV interpolation for resizing between two sizes.
     
-    # Paste the foreground object onto the black background
-    final_img = Image.alpha_composite(black_bg, img)
+    Args:
+        source_size: Source size as (height, width)
+        target_size: Target size as (height, width)
     
-    # Convert to RGB numpy array
-    rgb_img = np.array(final_img.convert("RGB"))
+    Returns:
+        cv2.INTER_AREA when shrinking (best quality), else cv2.INTER_CUBIC
+    """
+    h, w = source_size
+    target_h, target_w = target_size
     
-    return rgb_img
+    if h > target_h or w > target_w:
+        return cv2.INTER_AREA
+    return cv2.INTER_CUBIC
 
 
-def resize_image(image: np.ndarray, target_size: tuple = (224, 224)) -> np.ndarray:
+def resize_image(
+    image: np.ndarray,
+    target_size: tuple = (224, 224),
+    interpolation: Optional[int] = None,
+) -> np.ndarray:
     """
     Resize image to target size using high-quality interpolation.
     
     Args:
         image: Input image array (H, W, 3) or (H, W)
         target_size: Target size as (height, width)
+        interpolation: OpenCV interpolation flag; chosen from the image
+            shape by resize_interpolation when None
     
     Returns:
         Resized image array
     """
-    # Use INTER_AREA for shrinking (best quality), INTER_CUBIC for enlarging
-    h, w = image.shape[:2]
+    if interpolation is None:
+        interpolation = resize_interpolation(image.shape[:2], target_size)
+    
     target_h, target_w = target_size
     
-    if h > target_h or w > target_w:
-        interpolation = cv2.INTER_AREA
-    else:
-        interpolation = cv2.INTER_CUBIC
+    return cv2.resize(image, (target_w, target_h), interpolation=interpolation)
+
+
+def _gaussian_derivative_kernels(sigma: float) -> tuple:
+    """
+    Sampled Gaussian and first-derivative kernels, as scipy.ndimage builds them.
     
-    resized = cv2.resize(image, (target_w, target_h), interpolation=interpolation)
+    Cut off at 8 standard deviations; further taps are below float32
+    resolution. Returned reversed, since cv2 filters correlate while
+    scipy.ndimage.gaussian_filter convolves.
+    
+    Args:
+        sigma: Standard deviation in pixels
     
-    return resized
+    Returns:
+        Tuple of (smoothing, derivative) float32 kernels
+    """
+    radius = int(8 * sigma + 0.5)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    phi = np.exp(-0.5 / sigma ** 2 * x ** 2)
+    phi /= phi.sum()
+    return (
+        phi[::-1].astype(np.float32),
+        (-x / sigma ** 2 * phi)[::-1].astype(np.float32)
+    )
+
+
+def frangi_vesselness(image: np.ndarray) -> np.ndarray:
+    """
+    Frangi vesselness for dark ridges, as skimage.filters.frangi computes it.
+    
+    Per scale, the Hessian comes from two successive first-order Gaussian
+    derivative passes at sigma / sqrt(2) (reflected borders), done with
+    OpenCV's separable float32 filters; its eigenvalues use the 2x2 closed
+    form. The response is the pixelwise maximum over FRANGI_SIGMAS.
+    
+    Args:
+        image: Grayscale image (H, W)
+    
+    Returns:
+        Vesselness, float32 (H, W)
+    """
+    image = image.astype(np.float32)
+    filtered_max = np.zeros_like(image)
+    gamma = None
+    
+    def filter_(src, kernel_x, kernel_y):
+        return cv2.sepFilter2D(
+            src, cv2.CV_32F, kernel_x, kernel_y, borderType=cv2.BORDER_REFLECT
+        )
+    
+    for sigma in FRANGI_SIGMAS:
+        smooth, deriv = _gaussian_derivative_kernels(sigma / np.sqrt(2))
+        grad_r = filter_(image, smooth, deriv)
+        grad_c = filter_(image, deriv, smooth)
+        h_rr = filter_(grad_r, smooth, deriv)
+        h_rc = filter_(grad_r, deriv, smooth)
+        h_cc = filter_(grad_c, deriv, smooth)
+        
+        # Eigenvalues of [[h_rr, h_rc], [h_rc, h_cc]]: lambda2 is the one
+        # of larger magnitude (that's mean + half_gap when mean > 0)
+        mean = (h_rr + h_cc) / 2
+        half_gap = np.sqrt(h_rc ** 2 + ((h_rr - h_cc) / 2) ** 2)
+        lambda1 = np.where(mean > 0, mean - half_gap, mean + half_gap)
+        lambda2 = np.where(mean > 0, mean + half_gap, mean - half_gap)
+        
+        structure_sq = lambda1 ** 2 + lambda2 ** 2
+        if gamma is None:
+            # Set from the first scale and kept for the rest, as in skimage
+            gamma = np.sqrt(structure_sq.max()) / 2 or 1
+        
+        # Negative lambda2 (bright ridges) is clipped so blobness underflows
+        blobness_sq = (np.abs(lambda1) / np.maximum(lambda2, 1e-10)) ** 2
+        vals = np.exp(-blobness_sq / (2 * FRANGI_BETA ** 2))
+        vals *= 1 - np.exp(-structure_sq / (2 * gamma ** 2))
+        np.maximum(filtered_max, vals, out=filtered_max)
+    
+    return filtered_max
 
 
 def vein_enhancement(rgb_image: np.ndarray) -> np.ndarray:
@@ -83,33 +327,307 @@ def vein_enhancement(rgb_image: np.ndarray) -> np.ndarray:
     green_channel = rgb_image[:, :, 1]
     
     # Step 2: Apply CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    green_clahe = clahe.apply(green_channel)
+    green_clahe = get_clahe().apply(green_channel)
     
     # Step 3: Apply Frangi filter
-    frangi_filtered = frangi(green_clahe, scale_range=(1, 4), scale_step=1)
+    frangi_filtered = frangi_vesselness(green_clahe)
     
-    # Normalize to 0–255
-    frangi_norm = cv2.normalize(
-        frangi_filtered, None, 0, 255, cv2.NORM_MINMAX
-    ).astype(np.uint8)
+    # Scale to 0–255, staying in float32 so the top-hat sees the full
+    # precision of the response
+    frangi_norm = cv2.normalize(frangi_filtered, None, 0, 255, cv2.NORM_MINMAX)
     
     # Step 4: Morphological top-hat
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-    top_hat = cv2.morphologyEx(frangi_norm, cv2.MORPH_TOPHAT, kernel)
+    top_hat = cv2.morphologyEx(frangi_norm, cv2.MORPH_TOPHAT, _TOPHAT_KERNEL)
     
-    # Step 5: Contrast stretching
+    # Step 5: Contrast stretching between the 2nd and 98th percentiles,
+    # quantized to uint8 only here
     p2, p98 = np.percentile(top_hat, (2, 98))
-    contrast_stretched = exposure.rescale_intensity(top_hat, in_range=(p2, p98))
+    if p98 <= p2:
+        # No contrast to stretch
+        return np.zeros(top_hat.shape, dtype=np.uint8)
+    
+    scale = 255 / (p98 - p2)
+    np.clip(top_hat, p2, p98, out=top_hat)
+    
+    return cv2.convertScaleAbs(top_hat, alpha=scale, beta=-p2 * scale)
+
+
+def _gabor_kernel(frequency: float, theta: float) -> np.ndarray:
+    """
+    Build a complex Gabor kernel, matching skimage.filters.gabor_kernel.
+    
+    Uses a bandwidth of 1 octave and an isotropic Gaussian envelope cut off
+    at 3 standard deviations.
+    
+    Args:
+        frequency: Spatial frequency of the harmonic (cycles per pixel)
+        theta: Orientation in radians
+    
+    Returns:
+        Complex kernel (2 * r + 1, 2 * r + 1) centred on (r, r)
+    """
+    bandwidth = 1
+    n_stds = 3
+    sigma = (
+        1 / np.pi * np.sqrt(np.log(2) / 2)
+        * (2.0 ** bandwidth + 1) / (2.0 ** bandwidth - 1)
+        / frequency
+    )
+    ct, st = np.cos(theta), np.sin(theta)
+    r = np.ceil(max(abs(n_stds * sigma * ct), abs(n_stds * sigma * st), 1))
+    y, x = np.meshgrid(
+        np.arange(-r, r + 1), np.arange(-r, r + 1), indexing="ij", sparse=True
+    )
+    rotx = x * ct + y * st
+    roty = -x * st + y * ct
+    
+    g = np.exp(-0.5 * (rotx ** 2 + roty ** 2) / sigma ** 2)
+    g /= 2 * np.pi * sigma ** 2
+    return g * np.exp(1j * 2 * np.pi * frequency * rotx)
+
+
+# Spatial kernels for the bank, and the border needed so the largest one
+# never reads past the (reflected) edge of the image
+_GABOR_KERNELS = tuple(_gabor_kernel(freq, theta) for freq, theta in GABOR_BANK)
+_GABOR_PAD = max(max(k.shape) for k in _GABOR_KERNELS) // 2
+
+
+@lru_cache(maxsize=4)
+def _gabor_bank_fft(shape: tuple) -> tuple:
+    """
+    Frequency responses of the Gabor bank for a padded image shape.
+    
+    Each kernel is zero-padded to the shape with its centre rolled to the
+    origin, so multiplying spectra gives a centred convolution.
+    
+    Args:
+        shape: FFT shape (height, width)
+    
+    Returns:
+        Tuple of complex64 spectra, one per GABOR_BANK entry
+    """
+    spectra = []
+    for kernel in _GABOR_KERNELS:
+        kh, kw = kernel.shape
+        padded = np.zeros(shape, dtype=np.complex64)
+        padded[:kh, :kw] = kernel
+        padded = np.roll(padded, (-(kh // 2), -(kw // 2)), axis=(0, 1))
+        spectra.append(fft.fft2(padded))
+    return tuple(spectra)
+
+
+def gabor_magnitude(image: np.ndarray) -> np.ndarray:
+    """
+    Pixelwise maximum Gabor magnitude over the filter bank.
+    
+    All filters share the input, so it's transformed once and each filter
+    is a pointwise multiply plus an inverse FFT. Borders are reflected as
+    with skimage.filters.gabor's default mode.
+    
+    Args:
+        image: Grayscale image (H, W)
+    
+    Returns:
+        Maximum |response| over GABOR_BANK, float32 (H, W)
+    """
+    h, w = image.shape
+    pad = _GABOR_PAD
+    padded = cv2.copyMakeBorder(
+        image, pad, pad, pad, pad, cv2.BORDER_REFLECT
+    ).astype(np.float32)
+    shape = (fft.next_fast_len(h + 2 * pad), fft.next_fast_len(w + 2 * pad))
+    
+    spectrum = fft.fft2(padded, s=shape, workers=_fft_workers)
+    
+    # |response| is taken straight from the complex64 result into a reused
+    # float32 buffer (one pass, no de-interleaved real/imag planes)
+    combined = np.zeros((h, w), dtype=np.float32)
+    magnitude = np.empty_like(combined)
+    for kernel_fft in _gabor_bank_fft(shape):
+        response = fft.ifft2(spectrum * kernel_fft, workers=_fft_workers)
+        np.abs(response[pad:pad + h, pad:pad + w], out=magnitude)
+        np.maximum(combined, magnitude, out=combined)
+    return combined
+
+
+# Circular neighbour offsets, as skimage's local_binary_pattern computes them,
+# split into the top-left pixel of each bilinear sample and whether the
+# sample needs the next row / column
+_LBP_ANGLES = 2 * np.pi * np.arange(LBP_POINTS, dtype=np.float64) / LBP_POINTS
+_LBP_DY = np.round(-LBP_RADIUS * np.sin(_LBP_ANGLES), 5)
+_LBP_DX = np.round(LBP_RADIUS * np.cos(_LBP_ANGLES), 5)
+_LBP_OY = np.floor(_LBP_DY).astype(np.int64)
+_LBP_OX = np.floor(_LBP_DX).astype(np.int64)
+_LBP_STEP_Y = (_LBP_DY != _LBP_OY).astype(np.int64)
+_LBP_STEP_X = (_LBP_DX != _LBP_OX).astype(np.int64)
+
+
+def _lbp_uniform_lut(n_points: int) -> np.ndarray:
+    """
+    Uniform LBP code for every n_points-bit neighbour pattern.
     
-    # Ensure uint8 format
-    final_result = (
-        (contrast_stretched * 255).astype(np.uint8)
-        if contrast_stretched.max() <= 1
-        else contrast_stretched
+    A pattern with at most two 0/1 changes between consecutive neighbours
+    (not wrapping around, as in skimage) maps to its number of set bits;
+    every other pattern maps to n_points + 1.
+    
+    Args:
+        n_points: Number of neighbours (bits per pattern)
+    
+    Returns:
+        uint8 lookup table indexed by the packed pattern (2 ** n_points,)
+    """
+    patterns = np.arange(1 << n_points, dtype=np.uint32)
+    bits = (patterns[:, np.newaxis] >> np.arange(n_points, dtype=np.uint32)) & 1
+    ones = bits.sum(axis=1)
+    changes = (bits[:, 1:] != bits[:, :-1]).sum(axis=1)
+    return np.where(changes <= 2, ones, n_points + 1).astype(np.uint8)
+
+
+# Built once at import (64 KiB for 16 neighbours)
+_LBP_UNIFORM_LUT = _lbp_uniform_lut(LBP_POINTS)
+
+
+def _lbp_uniform_kernel(image, dy, dx, oy, ox, step_y, step_x, lut):
+    """
+    Rotation-invariant uniform LBP over a uint8 image.
+    
+    Written for numba: one pass over the image, uint8 codes out. Each
+    neighbour is bilinearly sampled in float64 with the same arithmetic as
+    skimage (pixels outside the image read as 0), so ties against the
+    centre resolve identically. The neighbour bits are packed and mapped
+    to their code through lut.
+    """
+    rows, cols = image.shape
+    n_points = dy.shape[0]
+    out = np.empty((rows, cols), dtype=np.uint8)
+    
+    for r in numba.prange(rows):
+        for c in range(cols):
+            center = float(image[r, c])
+            pattern = 0
+            for i in range(n_points):
+                r0 = r + oy[i]
+                c0 = c + ox[i]
+                r1 = r0 + step_y[i]
+                c1 = c0 + step_x[i]
+                if r0 >= 0 and c0 >= 0 and r1 < rows and c1 < cols:
+                    top_left = float(image[r0, c0])
+                    top_right = float(image[r0, c1])
+                    bottom_left = float(image[r1, c0])
+                    bottom_right = float(image[r1, c1])
+                else:
+                    top_left = top_right = bottom_left = bottom_right = 0.0
+                    if 0 <= r0 < rows:
+                        if 0 <= c0 < cols:
+                            top_left = float(image[r0, c0])
+                        if 0 <= c1 < cols:
+                            top_right = float(image[r0, c1])
+                    if 0 <= r1 < rows:
+                        if 0 <= c0 < cols:
+                            bottom_left = float(image[r1, c0])
+                        if 0 <= c1 < cols:
+                            bottom_right = float(image[r1, c1])
+                
+                fy = (r + dy[i]) - r0
+                fx = (c + dx[i]) - c0
+                top = (1 - fx) * top_left + fx * top_right
+                bottom = (1 - fx) * bottom_left + fx * bottom_right
+                if (1 - fy) * top + fy * bottom - center >= 0:
+                    pattern |= 1 << i
+            out[r, c] = lut[pattern]
+    
+    return out
+
+
+if numba is not None:
+    _lbp_uniform_jit = numba.njit(parallel=True, nogil=True, cache=True)(
+        _lbp_uniform_kernel
     )
+else:
+    _lbp_uniform_jit = None
+
+
+def _lbp_uniform_numpy(image: np.ndarray) -> np.ndarray:
+    """
+    Vectorized equivalent of _lbp_uniform_kernel, one neighbour at a time.
+    
+    Args:
+        image: Grayscale uint8 image (H, W)
     
-    return final_result
+    Returns:
+        LBP codes in [0, LBP_POINTS + 1], uint8 (H, W)
+    """
+    rows, cols = image.shape
+    pad = LBP_RADIUS + 1
+    padded = np.pad(image.astype(np.float64), pad)
+    center = padded[pad:pad + rows, pad:pad + cols]
+    r = np.arange(rows, dtype=np.float64)[:, np.newaxis]
+    c = np.arange(cols, dtype=np.float64)[np.newaxis, :]
+    
+    pattern = np.zeros((rows, cols), dtype=np.uint32)
+    for i in range(LBP_POINTS):
+        r0 = pad + _LBP_OY[i]
+        c0 = pad + _LBP_OX[i]
+        r1 = r0 + _LBP_STEP_Y[i]
+        c1 = c0 + _LBP_STEP_X[i]
+        top_left = padded[r0:r0 + rows, c0:c0 + cols]
+        top_right = padded[r0:r0 + rows, c1:c1 + cols]
+        bottom_left = padded[r1:r1 + rows, c0:c0 + cols]
+        bottom_right = padded[r1:r1 + rows, c1:c1 + cols]
+        
+        # Per-row / per-column fractions, computed as the kernel does
+        fy = (r + _LBP_DY[i]) - (r + _LBP_OY[i])
+        fx = (c + _LBP_DX[i]) - (c + _LBP_OX[i])
+        top = (1 - fx) * top_left + fx * top_right
+        bottom = (1 - fx) * bottom_left + fx * bottom_right
+        pattern |= ((1 - fy) * top + fy * bottom - center >= 0).astype(np.uint32) << i
+    
+    return _LBP_UNIFORM_LUT[pattern]
+
+
+def local_binary_pattern_uniform(image: np.ndarray) -> np.ndarray:
+    """
+    Uniform LBP codes with LBP_POINTS neighbours at LBP_RADIUS.
+    
+    Same codes as skimage.feature.local_binary_pattern(image, LBP_POINTS,
+    LBP_RADIUS, "uniform"), computed by a numba kernel when numba is
+    installed and by NumPy otherwise.
+    
+    Args:
+        image: Grayscale uint8 image (H, W)
+    
+    Returns:
+        LBP codes in [0, LBP_POINTS + 1], uint8 (H, W)
+    """
+    if _lbp_uniform_jit is None:
+        return _lbp_uniform_numpy(image)
+    
+    return _lbp_uniform_jit(
+        image, _LBP_DY, _LBP_DX, _LBP_OY, _LBP_OX, _LBP_STEP_Y, _LBP_STEP_X,
+        _LBP_UNIFORM_LUT
+    )
+
+
+def unsharp_image(gray: np.ndarray) -> np.ndarray:
+    """
+    Unsharp mask a uint8 image, matching skimage's unsharp_mask(radius=1, amount=1).
+    
+    The blur is done in float32 with scipy's 4-sigma truncation and
+    symmetric border, so only rare rounding ties differ by 1 from
+    img_as_ubyte(unsharp_mask(...)).
+    
+    Args:
+        gray: Grayscale uint8 image (H, W)
+    
+    Returns:
+        Sharpened uint8 image (H, W)
+    """
+    blurred = cv2.GaussianBlur(
+        gray.astype(np.float32), (9, 9), 1.0, borderType=cv2.BORDER_REFLECT
+    )
+    
+    # gray + (gray - blurred), rounded and saturated to uint8
+    return cv2.addWeighted(gray, 2.0, blurred, -1.0, 0.0, dtype=cv2.CV_8U)
 
 
 def texture_enhancement(rgb_image: np.ndarray) -> np.ndarray:
@@ -122,51 +640,32 @@ def texture_enhancement(rgb_image: np.ndarray) -> np.ndarray:
     Returns:
         Texture-enhanced RGB image (H, W, 3)
     """
-    # LBP and Gabor Parameters
-    radius = 2
-    n_points = 8 * radius
-    method = "uniform"
-    
-    frequencies = [0.2, 0.3]
-    orientations = [0, np.pi / 4, np.pi / 2, 3 * np.pi / 4]
-    
     # Convert to grayscale
     gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
     
     # Apply unsharp mask
-    unsharp = unsharp_mask(gray, radius=1, amount=1)
-    unsharp = img_as_ubyte(unsharp)
+    unsharp = unsharp_image(gray)
     
     # Local Binary Pattern
-    lbp = local_binary_pattern(unsharp, n_points, radius, method).astype(np.uint8)
+    lbp = local_binary_pattern_uniform(unsharp)
     
-    # Gabor filter responses
-    gabor_responses = []
-    for theta in orientations:
-        for freq in frequencies:
-            real, imag = gabor(unsharp, frequency=freq, theta=theta)
-            mag = np.sqrt(real**2 + imag**2)
-            gabor_responses.append(mag)
-    
-    gabor_combined = np.max(np.array(gabor_responses), axis=0)
+    # Gabor filter responses (strongest over the bank)
+    gabor_combined = gabor_magnitude(unsharp)
     gabor_combined = img_as_ubyte(gabor_combined / gabor_combined.max())
     
-    # Merge into 3-channel image
-    merged = cv2.merge([
-        cv2.equalizeHist(lbp),
-        gabor_combined,
-        unsharp
-    ])
-    
-    # Convert BGR to RGB (cv2.merge creates BGR)
-    merged_rgb = cv2.cvtColor(merged, cv2.COLOR_BGR2RGB)
+    # Write the channels straight into an RGB buffer (unsharp, Gabor,
+    # equalized LBP), the order the former merge + BGR2RGB produced
+    texture_rgb = np.empty((*unsharp.shape, 3), dtype=np.uint8)
+    texture_rgb[..., 0] = unsharp
+    texture_rgb[..., 1] = gabor_combined
+    texture_rgb[..., 2] = cv2.equalizeHist(lbp)
     
-    return merged_rgb
+    return texture_rgb
 
 
 def preprocess_all_modalities(image_bytes: bytes, target_size: tuple = (224, 224)) -> tuple:
     """
-    Complete preprocessing pipeline: background removal -> vein & texture enhancement -> resize.
+    Complete preprocessing pipeline: decode -> background removal -> resize -> vein & texture enhancement.
     
     Args:
         image_bytes: Raw image bytes from uploaded file
@@ -176,19 +675,24 @@ def preprocess_all_modalities(image_bytes: bytes, target_size: tuple = (224, 224
         Tuple of (rgb_clean, vein_enhanced, texture_enhanced) as numpy arrays,
         all resized to target_size
     """
-    # Step 1: Remove background
-    rgb_clean = remove_background(image_bytes)
+    # Step 1: Decode and remove background
+    rgb_clean = remove_background(decode_image(image_bytes))
     
-    # Step 2: Vein enhancement (returns grayscale, need to convert to 3-channel)
-    vein_gray = vein_enhancement(rgb_clean)
-    vein_3ch = cv2.cvtColor(vein_gray, cv2.COLOR_GRAY2RGB)
-    
-    # Step 3: Texture enhancement
-    texture_3ch = texture_enhancement(rgb_clean)
-    
-    # Step 4: Resize all modalities to target size (CRITICAL FOR MODEL!)
+    # Step 2: Resize to target size (CRITICAL FOR MODEL!) before enhancing,
+    # so the filters only process the pixels the model sees
     rgb_resized = resize_image(rgb_clean, target_size)
-    vein_resized = resize_image(vein_3ch, target_size)
-    texture_resized = resize_image(texture_3ch, target_size)
+    
+    # Steps 3-4: Vein (grayscale) and texture enhancement only read
+    # rgb_resized, so they run concurrently; OpenCV, NumPy, scipy.fft and
+    # the LBP kernel release the GIL for their inner loops
+    vein_future = _branch_pool.submit(vein_enhancement, rgb_resized)
+    texture_resized = texture_enhancement(rgb_resized)
+    vein_resized = vein_future.result()
+    
+    # The model wants 3 identical channels for the vein input; expand the
+    # single channel as a read-only view rather than a GRAY2RGB copy
+    vein_resized = np.broadcast_to(
+        vein_resized[..., np.newaxis], (*vein_resized.shape, 3)
+    )
     
     return rgb_resized, vein_resized, texture_resized
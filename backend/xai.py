@@ -2,67 +2,169 @@
 Explainable AI utilities for Grad-CAM and Grad-CAM++ visualization.
 """
 
+import weakref
+
 import cv2
 import numpy as np
 import tensorflow as tf
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 
+# JET colormap as a 256-entry lookup table in RGB order, so overlays are
+# colored and blended in RGB without converting the image to BGR and back
+_JET_RGB_LUT = np.ascontiguousarray(
+    cv2.applyColorMap(
+        np.arange(256, dtype=np.uint8)[:, np.newaxis], cv2.COLORMAP_JET
+    )[:, :, ::-1]
+)
 
-def get_gradcam_heatmap(
-    model: tf.keras.Model,
-    img_inputs: List[np.ndarray],
-    layer_name: str,
-    class_index: Optional[int] = None,
-    use_gradcam_plus_plus: bool = False
-) -> np.ndarray:
+
+@tf.function(jit_compile=True)
+def _gradcam_plus_plus_weights(
+    conv_outputs: tf.Tensor, grads: tf.Tensor
+) -> tf.Tensor:
     """
-    Generates Grad-CAM or Grad-CAM++ heatmap for a multimodal model.
+    Compute Grad-CAM++ channel weights.
+    
+    Compiled with XLA so the grad^2 / grad^3 / alpha chain is fused into a
+    single kernel that reads the gradient tensor once.
+    
+    Args:
+        conv_outputs: Target layer activations (B, H, W, C)
+        grads: Gradients of the class score w.r.t. conv_outputs (B, H, W, C)
+    
+    Returns:
+        Channel weights (B, C)
+    """
+    grads_power_2 = grads * grads
+    grads_power_3 = grads_power_2 * grads
+    sum_grads = tf.reduce_sum(
+        conv_outputs * grads_power_3, axis=(1, 2), keepdims=True
+    )
+    
+    eps = 1e-8
+    alpha_denom = 2 * grads_power_2 + sum_grads
+    alpha_denom = tf.where(alpha_denom != 0.0, alpha_denom, eps)
+    alphas = grads_power_2 / alpha_denom
+    
+    return tf.reduce_sum(alphas * tf.nn.relu(grads), axis=(1, 2))
+
+
+def build_grad_model(model: tf.keras.Model, layer_name: str) -> tf.keras.Model:
+    """
+    Build a model mapping the inputs to (target layer activations, predictions).
     
     Args:
         model: Trained Keras model
-        img_inputs: List of input arrays [rgb, vein, tex], each shaped (1, H, W, 3)
         layer_name: Name of the last convolutional layer (string)
-        class_index: Target class index (int), if None uses predicted class
-        use_gradcam_plus_plus: True for Grad-CAM++, False for standard Grad-CAM
     
     Returns:
-        Heatmap array (H, W) normalized to [0, 1]
+        Keras model with outputs [layer activations, predictions]
     """
-    grad_model = tf.keras.models.Model(
+    return tf.keras.models.Model(
         inputs=model.inputs,
         outputs=[model.get_layer(layer_name).output, model.output]
     )
+
+
+def compute_gradients(
+    grad_model: tf.keras.Model,
+    img_inputs: List[np.ndarray],
+    class_index: Optional[int] = None
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Compute target layer activations and their gradients for a class score.
+    
+    Args:
+        grad_model: Model built by build_grad_model
+        img_inputs: List of input arrays [rgb, vein, tex], each shaped (1, H, W, 3)
+        class_index: Target class index (int), if None uses predicted class
     
+    Returns:
+        Tuple of (conv_outputs, grads), each (1, h, w, C)
+    """
     with tf.GradientTape() as tape:
         conv_outputs, predictions = grad_model(img_inputs)
         predictions = (
             predictions if isinstance(predictions, tf.Tensor) else predictions[0]
         )
         if class_index is None:
-            class_index = tf.argmax(predictions[0])
+            # Target selection isn't differentiated, so keep it off the tape
+            with tape.stop_recording():
+                class_index = tf.argmax(predictions[0])
         output = predictions[:, class_index]
     
     grads = tape.gradient(output, conv_outputs)
     
-    if use_gradcam_plus_plus:
-        # --- Grad-CAM++ variant ---
-        grads_power_2 = tf.pow(grads, 2)
-        grads_power_3 = tf.pow(grads, 3)
-        sum_grads = tf.reduce_sum(conv_outputs * grads_power_3, axis=(1, 2))
-        
-        # Ensure shape compatibility for broadcasting
-        sum_grads = tf.reshape(
-            sum_grads, [tf.shape(sum_grads)[0], 1, 1, tf.shape(sum_grads)[-1]]
+    return conv_outputs, grads
+
+
+def compute_gradcam(
+    grad_model: tf.keras.Model,
+    img_inputs: List[tf.Tensor],
+    use_gradcam_plus_plus: bool = True,
+    class_index: Optional[tf.Tensor] = None
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Compute predictions and Grad-CAM heatmaps from a single forward pass.
+    
+    By default each sample's heatmap targets its own predicted class, so the
+    softmax used for top-k and the activations used for Grad-CAM come from
+    the same pass through the network.
+    
+    Args:
+        grad_model: Model built by build_grad_model
+        img_inputs: List of input batches [rgb, vein, tex], each (N, H, W, 3)
+        use_gradcam_plus_plus: True for Grad-CAM++, False for standard Grad-CAM
+        class_index: Optional int64 target class per sample (N,), e.g. the
+            top class of a converted model; if None uses the predicted class
+    
+    Returns:
+        Tuple of (predictions, heatmaps)
+        - predictions: Softmax probabilities (N, num_classes)
+        - heatmaps: uint8 heatmaps (N, h, w), each scaled to [0, 255]
+    """
+    with tf.GradientTape() as tape:
+        conv_outputs, predictions = grad_model(img_inputs, training=False)
+        predictions = (
+            predictions if isinstance(predictions, tf.Tensor) else predictions[0]
         )
-        
-        eps = 1e-8
-        alpha_num = grads_power_2
-        alpha_denom = 2 * grads_power_2 + sum_grads
-        alpha_denom = tf.where(
-            alpha_denom != 0.0, alpha_denom, eps
+        if class_index is None:
+            # Target selection isn't differentiated, so keep it off the tape
+            with tape.stop_recording():
+                class_index = tf.argmax(predictions, axis=-1)
+        # Samples are independent, so the gradient of the summed scores
+        # w.r.t. each sample's activations is that sample's own gradient
+        output = tf.reduce_sum(
+            tf.gather(predictions, class_index, axis=1, batch_dims=1)
         )
-        alphas = alpha_num / alpha_denom
-        weights = tf.reduce_sum(alphas * tf.nn.relu(grads), axis=(1, 2))
+    
+    grads = tape.gradient(output, conv_outputs)
+    
+    return predictions, _heatmap_from_gradients(
+        conv_outputs, grads, use_gradcam_plus_plus
+    )
+
+
+def _heatmap_from_gradients(
+    conv_outputs: tf.Tensor, grads: tf.Tensor, use_gradcam_plus_plus: bool
+) -> tf.Tensor:
+    """
+    Weight the activations by their gradients and normalize per sample.
+    
+    The heatmaps are quantized to uint8 on-device, so the host copy is a
+    quarter the size and ready for the colormap.
+    
+    Args:
+        conv_outputs: Target layer activations (B, H, W, C)
+        grads: Gradients of the class score w.r.t. conv_outputs (B, H, W, C)
+        use_gradcam_plus_plus: True for Grad-CAM++, False for standard Grad-CAM
+    
+    Returns:
+        uint8 heatmaps (B, H, W), each scaled to [0, 255]
+    """
+    if use_gradcam_plus_plus:
+        # --- Grad-CAM++ variant ---
+        weights = _gradcam_plus_plus_weights(conv_outputs, grads)
     else:
         # --- Standard Grad-CAM ---
         weights = tf.reduce_mean(grads, axis=(1, 2))
@@ -71,7 +173,100 @@ def get_gradcam_heatmap(
         tf.multiply(weights[:, tf.newaxis, tf.newaxis, :], conv_outputs), axis=-1
     )
     heatmap = tf.nn.relu(cam)
-    heatmap = heatmap / tf.reduce_max(heatmap)
+    # An all-zero map (no positive evidence) stays zero rather than NaN
+    heatmap = tf.math.divide_no_nan(
+        heatmap, tf.reduce_max(heatmap, axis=(1, 2), keepdims=True)
+    )
+    
+    return tf.cast(tf.round(heatmap * 255.0), tf.uint8)
+
+
+# Traced heatmap functions for callers without a prebuilt grad_fn, per model
+# and (layer_name, use_gradcam_plus_plus); dropped with the model
+_HEATMAP_FN_CACHE = weakref.WeakKeyDictionary()
+
+
+def get_heatmap_fn(
+    model: tf.keras.Model, layer_name: str, use_gradcam_plus_plus: bool
+) -> Callable:
+    """
+    Get a graph-mode Grad-CAM function for a model, building it on first use.
+    
+    The grad model is built once and the gradient pass plus heatmap
+    computation run as one tf.function, so repeated calls skip both the
+    Keras model surgery and eager per-op dispatch. Like the serving
+    Grad-CAM pass it is not XLA-compiled.
+    
+    This is the path for standalone get_gradcam_heatmap calls; the API
+    server doesn't use it (/predict gets heatmaps from
+    TriModalClassifier.predict_with_gradcam), so benchmark that instead
+    when tuning serving latency.
+    
+    Args:
+        model: Trained Keras model
+        layer_name: Name of the last convolutional layer (string)
+        use_gradcam_plus_plus: True for Grad-CAM++, False for standard Grad-CAM
+    
+    Returns:
+        tf.function (img_inputs, class_index) -> uint8 heatmaps (N, h, w), where
+        class_index is an int32 scalar tensor or None for the predicted class
+    """
+    model_fns = _HEATMAP_FN_CACHE.setdefault(model, {})
+    key = (layer_name, use_gradcam_plus_plus)
+    
+    if key not in model_fns:
+        grad_model = build_grad_model(model, layer_name)
+        
+        @tf.function(reduce_retracing=True)
+        def heatmap_fn(img_inputs, class_index):
+            conv_outputs, grads = compute_gradients(
+                grad_model, img_inputs, class_index
+            )
+            return _heatmap_from_gradients(
+                conv_outputs, grads, use_gradcam_plus_plus
+            )
+        
+        model_fns[key] = heatmap_fn
+    
+    return model_fns[key]
+
+
+def get_gradcam_heatmap(
+    model: tf.keras.Model,
+    img_inputs: List[np.ndarray],
+    layer_name: str,
+    class_index: Optional[int] = None,
+    use_gradcam_plus_plus: bool = False,
+    grad_fn: Optional[Callable] = None
+) -> np.ndarray:
+    """
+    Generates Grad-CAM or Grad-CAM++ heatmap for a multimodal model.
+    
+    Args:
+        model: Trained Keras model
+        img_inputs: List of input arrays [rgb, vein, tex], each shaped (1, H, W, 3)
+        layer_name: Name of the last convolutional layer (string)
+        class_index: Target class index (int), if None uses predicted class
+        use_gradcam_plus_plus: True for Grad-CAM++, False for standard Grad-CAM
+        grad_fn: Optional prebuilt callable (img_inputs, class_index) ->
+            (conv_outputs, grads), e.g. wrapping compute_gradients;
+            if None the model's cached heatmap function is used
+    
+    Returns:
+        uint8 heatmap array (H, W) scaled to [0, 255]
+    """
+    if grad_fn is None:
+        heatmap_fn = get_heatmap_fn(model, layer_name, use_gradcam_plus_plus)
+        heatmap = heatmap_fn(
+            [tf.convert_to_tensor(img, tf.float32) for img in img_inputs],
+            None if class_index is None else tf.constant(class_index, tf.int32)
+        )
+    else:
+        conv_outputs, grads = grad_fn(img_inputs, class_index)
+        heatmap = _heatmap_from_gradients(
+            conv_outputs, grads, use_gradcam_plus_plus
+        )
+    
     heatmap = heatmap[0].numpy()
     
     return heatmap
@@ -83,7 +278,8 @@ def generate_gradcam_overlay(
     img_inputs: List[np.ndarray],
     layer_name: str = "fused_reduce",
     class_index: Optional[int] = None,
-    use_gradcam_plus_plus: bool = True
+    use_gradcam_plus_plus: bool = True,
+    grad_fn: Optional[Callable] = None
 ) -> np.ndarray:
     """
     Generate Grad-CAM++ heatmap overlay on RGB image.
@@ -95,29 +291,41 @@ def generate_gradcam_overlay(
         layer_name: Name of the last convolutional layer
         class_index: Target class index, if None uses predicted class
         use_gradcam_plus_plus: True for Grad-CAM++
+        grad_fn: Optional prebuilt gradient function, see get_gradcam_heatmap
     
     Returns:
         Heatmap overlay image as RGB array (H, W, 3)
     """
     # Generate Grad-CAM heatmap
     heatmap = get_gradcam_heatmap(
-        model, img_inputs, layer_name, class_index, use_gradcam_plus_plus
+        model, img_inputs, layer_name, class_index, use_gradcam_plus_plus,
+        grad_fn=grad_fn
     )
     
-    # Resize heatmap to match original image size
-    heatmap_resized = cv2.resize(heatmap, (rgb_image.shape[1], rgb_image.shape[0]))
-    heatmap_uint8 = np.uint8(255 * heatmap_resized)
-    
-    # Apply colormap
-    heatmap_colored = cv2.applyColorMap(heatmap_uint8, cv2.COLORMAP_JET)
+    return overlay_heatmap(rgb_image, heatmap)
+
+
+def overlay_heatmap(rgb_image: np.ndarray, heatmap: np.ndarray) -> np.ndarray:
+    """
+    Blend a precomputed Grad-CAM heatmap onto an RGB image.
     
-    # Convert RGB to BGR for cv2.addWeighted
-    rgb_bgr = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR)
+    Args:
+        rgb_image: Original RGB image (H, W, 3) - not preprocessed
+        heatmap: uint8 heatmap (h, w) scaled to [0, 255]
     
-    # Overlay heatmap on image
-    superimposed_img = cv2.addWeighted(rgb_bgr, 0.6, heatmap_colored, 0.4, 0)
+    Returns:
+        Heatmap overlay image as RGB array (H, W, 3)
+    """
+    # Resize heatmap to match original image size (already uint8)
+    heatmap_resized = cv2.resize(
+        heatmap, (rgb_image.shape[1], rgb_image.shape[0]),
+        interpolation=cv2.INTER_LINEAR
+    )
     
-    # Convert back to RGB
-    superimposed_rgb = cv2.cvtColor(superimposed_img, cv2.COLOR_BGR2RGB)
+    # Apply the JET colormap, directly in RGB order
+    heatmap_colored = cv2.applyColorMap(heatmap_resized, _JET_RGB_LUT)
     
-    return superimposed_rgb
+    # Overlay heatmap on image, reusing the colormap buffer as output
+    return cv2.addWeighted(
+        rgb_image, 0.6, heatmap_colored, 0.4, 0, dst=heatmap_colored
+    )